@@ -5,10 +5,14 @@ from .core.types import Args, ReturnMessage
 from .core import GLOBAL_CONF
 from .core import (get_config, args_chk, cprint, print_key, get_col,
                    get_timezone, interactive_view, run_system_cmd,
-                   print_error, print_warning, get_args)
+                   print_error, print_warning, print_message, get_args)
 from .core.dict_viewer import (show_keys_dict, get_item_dict,
-                               get_contents_dict, show_func_dict)
-from .core.image_viewer import is_image, show_image_file, show_image_ndarray
+                               get_contents_dict, show_func_dict,
+                               get_child_dict, is_dir_dict)
+from .core.json_loader import load_json, loads_json
+from .core.contents_cache import ContentsCache, cache_contents
+from .core.image_viewer import (is_image, show_image_file, show_image_ndarray,
+                                show_image_bytes)
 from .core.helpmsg import (help_template,
                            add_args_imageviewer, add_args_encoding,
                            add_args_output, add_args_verbose, add_args_key,
@@ -10,6 +10,7 @@ import mimetypes
 import pprint
 import copy
 from importlib import import_module, metadata
+from collections.abc import Iterable
 from pathlib import Path, PurePath
 from typing import Any, Literal
 from types import ModuleType, MappingProxyType
@@ -19,7 +20,7 @@ from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from pymeflib.color import FG, BG, FG256, BG256, END
 from pymeflib.tree2 import TreeViewer, GC, PPath
-from .types import CONF, Args, SF, COLType
+from .types import CONF, Args, ReturnMessage, SF, COLType
 
 sysver = sys.version_info
 if sysver.major*100+sysver.minor >= 311:
@@ -434,6 +435,7 @@ def interactive_view(fname: str, get_contents: GC, show_func: SF,
         and the second return value is a list of file names.
         In this context, a directory means something that includes
         files and directories, and a file means something that includes data.
+        The results are cached for each path (see ContentsCache).
     show_func: Callable[[str, **kwargs], ReturnMessage]
         A function to show the contents.
         The first argument is the path to a file.
@@ -442,6 +444,9 @@ def interactive_view(fname: str, get_contents: GC, show_func: SF,
         The return value is the ReturnMessage. It is treated as
         an error message if ReturnMessage.error is True. Otherwise, it is
         treated as a standard message.
+        The message can also be an iterable of lines, and lines are read
+        only when they are shown. Returning the iterable itself is
+        treated as a standard message.
     purepath: PurePath, PurePosixPath, or PureWindowsPath
         Specify the class to treat the path-like object.
         This is because in some case, the separator shoud be '/' not '\\'
@@ -456,6 +461,9 @@ def interactive_view(fname: str, get_contents: GC, show_func: SF,
     fg1, bg1 = get_col('interactive_path')
     fg2, bg2 = get_col('interactive_contents')
     fg3, bg3 = get_col('interactive_output')
+    # imported here since contents_cache uses GLOBAL_CONF.
+    from .contents_cache import cache_contents
+    get_contents = cache_contents(get_contents)
     tv = TreeViewer('.', get_contents, purepath=purepath, logger=__logger)
     while True:
         term_size = shutil.get_terminal_size()
@@ -488,16 +496,45 @@ def interactive_view(fname: str, get_contents: GC, show_func: SF,
             if key_name in files:
                 cprint('output::', '\n', fg=fg3, bg=bg3)
                 info = show_func(str(cpath/key_name), cui=False)
-                if not info.error:
-                    print(info.message)
-                else:
-                    print_error(info.message)
+                print_message(info)
             elif key_name in dirs:
                 cpath /= key_name
             else:
                 print_error(f'"{key_name}" is not a correct name')
 
 
+def print_message(info: ReturnMessage | Iterable[str], **kwargs) -> None:
+    """
+    print the message returned from show_func.
+    If the message is an iterable of lines, each line is printed
+    as soon as it is read.
+
+    Parameters
+    ----------
+    info: ReturnMessage or Iterable[str]
+        the returned message. It is printed by print_error if
+        ReturnMessage.error is True.
+    **kwargs
+        Keyword arguments to be passed to the print function.
+
+    Returns
+    -------
+    None
+    """
+    info = ReturnMessage.from_result(info)
+    if not info.is_stream():
+        if info.error:
+            print_error(info.message, **kwargs)
+        else:
+            print(info.message, **kwargs)
+        return
+    for line in info.lines():
+        if info.error:
+            print_error(line, **kwargs)
+        else:
+            print(line, **kwargs)
+
+
 def print_error(msg: str, **kwargs) -> None:
     """
     print error message.
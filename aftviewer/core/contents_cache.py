@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from logging import getLogger
+
+from pymeflib.tree2 import GC
+from . import GLOBAL_CONF, get_config
+
+logger = getLogger(GLOBAL_CONF.logname)
+
+
+class ContentsCache():
+    """
+    memoize the get_contents function.
+    Lists of directories and files are kept for each path,
+    and the least recently used path is removed
+    if the number of paths exceeds the limit.
+    Cached values are kept until the invalidate method is called.
+    An instance can be used as the get_contents function itself.
+
+    Parameters
+    ----------
+    get_contents: Callable[[PurePath], tuple[list[str], list[str]]]
+        A function to get lists of directories and files.
+        The argument is the path to an item.
+    max_items: int or None
+        The maximum number of cached paths.
+        If None, the "contents_cache_items" option is used.
+        If 0 or less, nothing is cached.
+    lock: lock object or None
+        The lock held while get_contents is called, so that get_contents
+        is not called from several threads at the same time.
+        Set the lock shared with other functions of the viewer
+        (e.g., show_func) if they can not run at the same time.
+        If None, a new reentrant lock is used.
+
+    Attributes:
+    hits: int
+        The number of calls returning the cached value.
+    misses: int
+        The number of calls running get_contents.
+    """
+    def __init__(self, get_contents: GC, max_items: None | int = None,
+                 lock: None | threading.RLock = None):
+        self.get_contents = get_contents
+        if max_items is None:
+            max_items = get_config('contents_cache_items')
+        self.max_items = max_items
+        # str(path) -> (dirs, files)
+        self.items: OrderedDict[str, tuple[list[str], list[str]]] = \
+            OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # get_contents may be called from the background threads.
+        # lock is for the cached values, and call_lock is for the viewer.
+        self.lock = threading.Lock()
+        self.call_lock = threading.RLock() if lock is None else lock
+
+    def __call__(self, path) -> tuple[list[str], list[str]]:
+        """
+        return lists of directories and files in the given path.
+        NOTE: the returned lists are shared with the cache,
+        so they should not be modified.
+        """
+        key = str(path)
+        res = self._get(key)
+        if res is not None:
+            return res
+        # get_contents of the viewer is not thread-safe in most cases.
+        with self.call_lock:
+            # the path may be read while waiting for the lock.
+            res = self._get(key)
+            if res is not None:
+                return res
+            with self.lock:
+                self.misses += 1
+            dirs, files = self.get_contents(path)
+        if self.max_items <= 0:
+            return dirs, files
+        with self.lock:
+            self.items[key] = (dirs, files)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                old, _ = self.items.popitem(last=False)
+                logger.debug(f'contents cache: remove {old}')
+        return dirs, files
+
+    def _get(self, key: str) -> None | tuple[list[str], list[str]]:
+        with self.lock:
+            res = self.items.get(key)
+            if res is not None:
+                self.items.move_to_end(key)
+                self.hits += 1
+            return res
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def invalidate(self, path=None) -> None:
+        """
+        remove the cached value of the given path.
+        If path is None, all cached values are removed.
+        """
+        with self.lock:
+            if path is None:
+                self.items.clear()
+            else:
+                self.items.pop(str(path), None)
+        logger.debug(f'contents cache: invalidate {path}')
+
+
+def cache_contents(get_contents: GC,
+                   lock: None | threading.RLock = None) -> ContentsCache:
+    """
+    return the memoized get_contents function.
+
+    Parameters
+    ----------
+    get_contents: Callable[[PurePath], tuple[list[str], list[str]]]
+        A function to get lists of directories and files.
+        If it is already a ContentsCache instance, it is returned as is.
+    lock: lock object or None
+        The lock held while get_contents is called.
+        See ContentsCache for details.
+
+    Returns
+    -------
+    ContentsCache
+        The memoized get_contents function.
+    """
+    if isinstance(get_contents, ContentsCache):
+        return get_contents
+    return ContentsCache(get_contents, lock=lock)
@@ -1,7 +1,18 @@
 from __future__ import annotations
 
+import os
 import re
+import sys
+import time
 import curses
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain, repeat
+from operator import add
+from collections import OrderedDict
+from collections.abc import Sequence
+from contextlib import nullcontext
 from curses.textpad import Textbox, rectangle
 from pathlib import PurePath
 from typing import Callable
@@ -10,7 +21,25 @@ from logging import getLogger, StreamHandler
 from pymeflib.tree2 import TreeViewer, GC, PPath
 from . import GLOBAL_CONF, get_config, get_col, print_error
 from .types import ReturnMessage, SF
+from .image_viewer import is_image
+from .contents_cache import ContentsCache, cache_contents
 logger = getLogger(GLOBAL_CONF.logname)
+if 'Pygments' in GLOBAL_CONF.pack_list:
+    from pygments.lexer import Lexer
+    from pygments.lexers import get_lexer_for_filename
+    from pygments.formatters.terminal import TERMINAL_COLORS
+    from pygments.util import ClassNotFound
+    use_pygments = True
+else:
+    use_pygments = False
+
+# colors used for the syntax highlighting (color pairs 9-16).
+_syntax_colors = [curses.COLOR_BLACK, curses.COLOR_RED, curses.COLOR_GREEN,
+                  curses.COLOR_YELLOW, curses.COLOR_BLUE,
+                  curses.COLOR_MAGENTA, curses.COLOR_CYAN,
+                  curses.COLOR_WHITE]
+_syntax_names = ['black', 'red', 'green', 'yellow', 'blue', 'magenta',
+                 'cyan', 'white']
 
 default_color_set = {
         'k': curses.COLOR_BLACK,
@@ -32,13 +61,684 @@ class CUIWin():
         self.h = height
         self.updatefunc = updatefunc
         self.b = curses.newwin(height, width, begin_y, begin_x)
+        # texts written in each row at the last update.
+        self.rows: list[None | list[tuple]] = [None]*height
+        # texts written in each row in the current update.
+        self.frame: None | list[list[tuple]] = None
 
     def update(self):
+        # only the rows changed from the last update are written.
+        # the window is copied to the screen by curses.doupdate().
         if self.updatefunc is None:
             return
-        self.b.clear()
-        self.updatefunc()
-        self.b.refresh()
+        self.frame = [[] for _ in range(self.h)]
+        try:
+            self.updatefunc()
+        finally:
+            frame, self.frame = self.frame, None
+        for y, row in enumerate(frame):
+            if row == self.rows[y]:
+                continue
+            self.b.move(y, 0)
+            self.b.clrtoeol()
+            for x, text, num, attr in row:
+                try:
+                    if num < 0:
+                        self.b.addstr(y, x, text, attr)
+                    else:
+                        self.b.addnstr(y, x, text, num, attr)
+                except curses.error as e:
+                    # e.g., writing at the bottom right corner.
+                    logger.debug(f'failed to write ({y}, {x}): {e}')
+            self.rows[y] = row
+        self.b.noutrefresh()
+
+    def invalidate(self):
+        # rewrite all rows at the next update;
+        # used after the window is written directly.
+        self.rows = [None]*self.h
+
+    def addstr(self, y: int, x: int, text: str,
+               attr: int = curses.A_NORMAL):
+        self.addnstr(y, x, text, -1, attr)
+
+    def addnstr(self, y: int, x: int, text: str, num: int,
+                attr: int = curses.A_NORMAL):
+        # keep the text to write it in update().
+        if self.frame is None:
+            if num < 0:
+                self.b.addstr(y, x, text, attr)
+            else:
+                self.b.addnstr(y, x, text, num, attr)
+        else:
+            self.frame[y].append((x, text, num, attr))
+
+
+class _MessageBuffer(Sequence):
+    # message shown in the main window.
+    # the message is kept as one string and the head positions of lines,
+    # and each line is sliced (and tabs are expanded) only when it is used.
+    # head positions are searched only until the line that is used.
+    chunk = 1 << 20
+
+    def __init__(self, text: None | str = None):
+        self.text = '' if text is None else text
+        self.heads = array('q')
+        self.num = 0
+        self.scanned = 0  # heads are searched until this position.
+        self.tabs: dict[int, array] = {}  # line -> tab positions
+        # wrap index; line -> number of segments of seg_width.
+        self.segs: dict[int, int] = {}
+        self.seg_width = 0
+        self.done = True  # all lines are read.
+        if text is None:
+            return
+        self.heads.append(0)
+        self.num = text.count('\n')+1
+
+    def make_heads(self, idx: int) -> None:
+        # search the heads of lines until idx-th line.
+        text = self.text
+        while len(self.heads) <= idx and self.scanned < len(text):
+            st = self.scanned
+            # split a chunk at once to keep memory usage small.
+            parts = text[st:st+self.chunk].split('\n')
+            self.scanned = st+self.chunk
+            if len(parts) == 1:
+                continue
+            self.heads.extend(accumulate(chain(
+                [st+len(parts[0])+1],
+                map(add, map(len, parts[1:-1]), repeat(1)))))
+
+    def __len__(self) -> int:
+        return self.num
+
+    def span(self, idx: int) -> tuple[int, int]:
+        # start and end positions of the line in the text.
+        if idx < 0:
+            idx += self.num
+        if not 0 <= idx < self.num:
+            raise IndexError('message index out of range')
+        self.make_heads(idx+1)
+        if idx+1 < self.num:
+            return self.heads[idx], self.heads[idx+1]-1
+        return self.heads[idx], len(self.text)
+
+    def fetch(self, num: int) -> None:
+        # all lines are already read.
+        return
+
+    def _line_text(self, idx: int) -> tuple[str, int, int]:
+        # the string including the line, and start and end positions.
+        st, end = self.span(idx)
+        return self.text, st, end
+
+    def raw(self, idx: int) -> str:
+        # the line without expanding tabs.
+        text, st, end = self._line_text(idx)
+        return text[st:end]
+
+    def _tab_pos(self, idx: int, text: str, st: int, end: int) -> array:
+        # positions of tabs in the line.
+        if idx not in self.tabs:
+            if len(self.tabs) >= 1024:
+                self.tabs.clear()
+            pos = array('q')
+            i = text.find('\t', st, end)
+            while i >= 0:
+                pos.append(i-st)
+                i = text.find('\t', i+1, end)
+            self.tabs[idx] = pos
+        return self.tabs[idx]
+
+    def line_len(self, idx: int) -> int:
+        # length of the line after expanding tabs.
+        text, st, end = self._line_text(idx)
+        return end-st+len(self._tab_pos(idx, text, st, end))
+
+    def segment(self, idx: int, col: int, width: int) -> str:
+        # return line[col:col+width] of the tab-expanded line
+        # without copying or expanding the whole line.
+        text, st, end = self._line_text(idx)
+        tabs = self._tab_pos(idx, text, st, end)
+        if len(tabs) == 0:
+            return text[st+col:min(st+col+width, end)]
+        # raw position r is shown at r+(number of tabs before r).
+        lo, hi = 0, end-st
+        while lo < hi:
+            mid = (lo+hi)//2
+            if mid+bisect_left(tabs, mid) < col:
+                lo = mid+1
+            else:
+                hi = mid
+        # col is in the middle of a tab if pre > 0.
+        pre = lo+bisect_left(tabs, lo)-col
+        res = ' '*pre+text[st+lo:min(st+lo+width, end)]
+        return res.replace('\t', '  ')[:width]
+
+    def num_segments(self, idx: int, width: int) -> int:
+        # number of segments of the line in the wrap mode.
+        if width != self.seg_width:
+            self.segs.clear()
+            self.seg_width = width
+        if idx not in self.segs:
+            if len(self.segs) >= 100000:
+                self.segs.clear()
+            self.segs[idx] = max(1, -(-self.line_len(idx)//width))
+        return self.segs[idx]
+
+    def expand_col(self, idx: int, col: int) -> int:
+        # column in the tab-expanded line of the raw column.
+        text, st, end = self._line_text(idx)
+        return col+bisect_left(self._tab_pos(idx, text, st, end), col)
+
+    def find_all(self, pattern: re.Pattern, lo: int,
+                 hi: int) -> tuple[array, array, array]:
+        # lines, start columns, and end columns (without expanding tabs)
+        # of matches in lo <= line < hi. matches are cut at the end of
+        # line, and empty matches are skipped.
+        lines, starts, ends = array('q'), array('q'), array('q')
+        hi = min(hi, self.num)
+        if lo >= hi:
+            return lines, starts, ends
+        pos = self.span(lo)[0]
+        endpos = self.span(hi-1)[1]
+        heads = self.heads
+        ln = lo
+        for m in pattern.finditer(self.text, pos, endpos):
+            st, end = m.span()
+            if st == end:
+                continue
+            ln = bisect_right(heads, st, ln, hi)-1
+            head = heads[ln]
+            if ln+1 < hi and end >= heads[ln+1]:
+                end = heads[ln+1]-1
+                if st == end:
+                    continue
+            lines.append(ln)
+            starts.append(st-head)
+            ends.append(end-head)
+        return lines, starts, ends
+
+    def nbytes(self) -> int:
+        # approximate memory usage.
+        return sys.getsizeof(self.text)+self.heads.itemsize*len(self.heads)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return self.raw(idx).replace('\t', '  ')
+
+
+class _StreamBuffer(_MessageBuffer):
+    # message given as an iterable of lines.
+    # lines are read from the iterable only when they are shown,
+    # so that the first screen is shown before show_func finishes.
+    def __init__(self, info: ReturnMessage):
+        super().__init__()
+        self.lines: list[str] = []
+        self.stream = info.message
+        self.source = info.lines()
+        self.done = False
+        # fetch is called by the main thread and the loader thread.
+        self.lock = threading.Lock()
+        # flag to stop fetch_all
+        self.stop = False
+
+    def fetch(self, num: int) -> None:
+        # read lines until the number of lines becomes num.
+        # all lines are read if num < 0.
+        if self.done or 0 <= num <= len(self.lines):
+            return
+        with self.lock:
+            while not self.done and (num < 0 or len(self.lines) < num):
+                try:
+                    self.lines.append(next(self.source))
+                except StopIteration:
+                    self.done = True
+                except Exception as e:
+                    logger.error(f'failed to read the message: {e}')
+                    self.lines.append(f'failed to read the message:'
+                                      f' {type(e).__name__}: {e}')
+                    self.done = True
+
+    def fetch_all(self, lock: None | threading.Lock = None,
+                  step: int = 1024) -> _StreamBuffer:
+        # read all lines in the loader thread.
+        # lines are read step by step so that the main thread can read
+        # the shown lines, and it is stopped by setting the stop flag.
+        self.stop = False
+        while not self.done and not self.stop:
+            with lock or nullcontext():
+                self.fetch(len(self.lines)+step)
+        return self
+
+    def close(self) -> None:
+        # close the source (e.g., a file opened in the archive).
+        # the lines not read yet are discarded.
+        self.stop = True
+        with self.lock:
+            self.done = True
+            for src in [self.source, self.stream]:
+                close = getattr(src, 'close', None)
+                if callable(close):
+                    close()
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def _line_text(self, idx: int) -> tuple[str, int, int]:
+        if idx < 0:
+            idx += len(self.lines)
+        if not 0 <= idx < len(self.lines):
+            raise IndexError('message index out of range')
+        line = self.lines[idx]
+        return line, 0, len(line)
+
+    def nbytes(self) -> int:
+        return sum(map(sys.getsizeof, self.lines))
+
+    def find_all(self, pattern: re.Pattern, lo: int,
+                 hi: int) -> tuple[array, array, array]:
+        self.fetch(hi)
+        lines, starts, ends = array('q'), array('q'), array('q')
+        for ln in range(lo, min(hi, len(self.lines))):
+            for m in pattern.finditer(self.lines[ln]):
+                st, end = m.span()
+                if st == end:
+                    continue
+                lines.append(ln)
+                starts.append(st)
+                ends.append(end)
+        return lines, starts, ends
+
+
+class _MatchIndex():
+    # all matches of the search word in the message.
+    # lines are searched by chunks only when they are needed,
+    # and the rest is searched while waiting for the key input.
+    chunk = 1 << 16  # number of lines searched at once
+
+    def __init__(self, word: str, message: _MessageBuffer):
+        self.word = word
+        self.message = message
+        self.pattern = re.compile(word, re.MULTILINE)
+        self.lines = array('q')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.searched = 0  # lines are searched until this line.
+        self.done = False
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def step(self) -> None:
+        # search the next chunk.
+        if self.done:
+            return
+        lo = self.searched
+        hi = lo+self.chunk
+        lines, starts, ends = self.message.find_all(self.pattern, lo, hi)
+        self.lines.extend(lines)
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        self.searched = min(hi, len(self.message))
+        if self.searched == len(self.message) and self.message.done:
+            self.done = True
+
+    def search_until(self, line: int) -> None:
+        while not self.done and self.searched <= line:
+            self.step()
+
+    def first_after(self, line: int) -> int:
+        # index of the first match in or after the line.
+        while True:
+            k = bisect_left(self.lines, line)
+            if k < len(self.lines) or self.done:
+                return k
+            self.step()
+
+    def has(self, k: int) -> bool:
+        # True if the k-th match exists.
+        while not self.done and k >= len(self.lines):
+            self.step()
+        return 0 <= k < len(self.lines)
+
+    def in_line(self, line: int) -> range:
+        # indices of matches in the line.
+        self.search_until(line)
+        lo = bisect_left(self.lines, line)
+        return range(lo, bisect_right(self.lines, line, lo))
+
+
+class _MessageCache():
+    # LRU cache of shown messages.
+    # the least recently used items are removed when the total size
+    # or the number of items exceeds the limits.
+    # on_remove is called with the removed or rejected values.
+    def __init__(self, max_bytes: int, max_items: int,
+                 on_remove: None | Callable[[object], None] = None):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.on_remove = on_remove
+        self.items: OrderedDict[tuple, tuple[object, int]] = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self.items
+
+    def get(self, key: tuple) -> None | object:
+        if key not in self.items:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(key)
+        return self.items[key][0]
+
+    def put(self, key: tuple, value: object, size: int) -> bool:
+        # return True if the value is kept in the cache.
+        removed = []
+        if key in self.items:
+            old_value, old_size = self.items.pop(key)
+            self.nbytes -= old_size
+            if old_value is not value:
+                removed.append(old_value)
+        if size > self.max_bytes or self.max_items <= 0:
+            removed.append(value)
+        else:
+            self.items[key] = (value, size)
+            self.nbytes += size
+        while self.nbytes > self.max_bytes or \
+                len(self.items) > self.max_items:
+            old_key, (old_value, old_size) = self.items.popitem(last=False)
+            self.nbytes -= old_size
+            removed.append(old_value)
+            logger.debug(f'remove {old_key} from cache ({old_size} bytes)')
+        if self.on_remove is not None:
+            for old_value in removed:
+                self.on_remove(old_value)
+        return key in self.items
+
+
+class _SidebarItems(Sequence):
+    # directories and files shown in the sidebar.
+    # the lists are not concatenated, and the type of each item is
+    # given by its index. the sorted order used to jump by a prefix
+    # is made only when it is used.
+    def __init__(self, dirs: None | list[str] = None,
+                 files: None | list[str] = None):
+        self.dirs = [] if dirs is None else dirs
+        self.files = [] if files is None else files
+        self.order: None | array = None
+
+    def __len__(self) -> int:
+        return len(self.dirs)+len(self.files)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('sidebar index out of range')
+        if idx < len(self.dirs):
+            return self.dirs[idx]
+        return self.files[idx-len(self.dirs)]
+
+    def is_dir(self, idx: int) -> bool:
+        if idx < 0:
+            idx += len(self)
+        return idx < len(self.dirs)
+
+    def find(self, prefix: str) -> int:
+        # index of the first item (in sorted order) starting with prefix.
+        # return -1 if not found.
+        if self.order is None:
+            self.order = array('q', sorted(range(len(self)),
+                                           key=self.__getitem__))
+        k = bisect_left(self.order, prefix, key=self.__getitem__)
+        if k < len(self.order) and self[self.order[k]].startswith(prefix):
+            return self.order[k]
+        return -1
+
+
+class _Highlighter():
+    # syntax highlighting of the message.
+    # only the lines shown in the window (and some lines before them
+    # to get the context) are lexed, and the result is cached by lines.
+    lookback = 50  # number of lines lexed before the shown lines.
+    max_lines = 4096  # max number of cached lines.
+
+    def __init__(self, message: _MessageBuffer, lexer: Lexer,
+                 style: Callable[[object], None | int]):
+        self.message = message
+        self.lexer = lexer
+        # token type -> curses attribute (None if not colored)
+        self.style = style
+        # line -> list of (start col, end col, attribute) without
+        # expanding tabs.
+        self.lines: dict[int, list[tuple[int, int, int]]] = {}
+
+    def lex(self, lo: int, hi: int) -> None:
+        # lex lines in lo <= line < hi if not cached.
+        hi = min(hi, len(self.message))
+        missing = [i for i in range(lo, hi) if i not in self.lines]
+        if len(missing) == 0:
+            return
+        if len(self.lines)+len(missing) > self.max_lines:
+            self.lines.clear()
+        lo, hi = missing[0], missing[-1]+1
+        start = max(0, lo-self.lookback)
+        text = '\n'.join(map(self.message.raw, range(start, hi)))+'\n'
+        line = start
+        col = 0
+        runs: list[tuple[int, int, int]] = []
+        for ttype, value in self.lexer.get_tokens(text):
+            attr = self.style(ttype)
+            parts = value.split('\n')
+            for k, part in enumerate(parts):
+                if k != 0:
+                    if line >= lo:
+                        self.lines[line] = runs
+                    line += 1
+                    col = 0
+                    runs = []
+                if part and attr is not None:
+                    if runs and runs[-1][1] == col and runs[-1][2] == attr:
+                        # join with the previous token.
+                        runs[-1] = (runs[-1][0], col+len(part), attr)
+                    else:
+                        runs.append((col, col+len(part), attr))
+                col += len(part)
+        for i in range(lo, hi):
+            self.lines.setdefault(i, [])
+
+    def runs(self, idx: int) -> list[tuple[int, int, int]]:
+        # colored ranges in the line.
+        if idx not in self.lines:
+            self.lex(idx, idx+1)
+        return self.lines[idx]
+
+
+class _Loader():
+    # call show_func in a worker thread.
+    # only the latest request is kept; the result of older requests
+    # and the request not started yet are discarded.
+    # the worker thread is a daemon thread not to wait for
+    # a slow show_func when the CUI is closed.
+    # if lock is given, func is called with the lock to avoid calling
+    # show_func from several threads at the same time.
+    def __init__(self, lock: None | threading.Lock = None,
+                 name: str = 'aftviewer-cui-loader'):
+        self.lock = lock
+        self.name = name
+        self.cond = threading.Condition()
+        self.thread: None | threading.Thread = None
+        self.request: None | tuple[int, Callable, tuple, dict] = None
+        self.result: None | ReturnMessage | Exception = None
+        self.req_id = 0
+        self.pending = False
+
+    def submit(self, func: Callable, *args, **kwargs) -> None:
+        with self.cond:
+            self.req_id += 1
+            self.request = (self.req_id, func, args, kwargs)
+            self.result = None
+            self.pending = True
+            self.cond.notify()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True,
+                                           name=self.name)
+            self.thread.start()
+
+    def cancel(self) -> None:
+        # a running show_func can not be stopped, but its result is dropped.
+        with self.cond:
+            self.req_id += 1
+            self.request = None
+            self.result = None
+            self.pending = False
+
+    def poll(self) -> None | ReturnMessage | Exception:
+        # return the result if the latest request is finished.
+        with self.cond:
+            res = self.result
+            if res is not None:
+                self.result = None
+                self.pending = False
+            return res
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while self.request is None:
+                    self.cond.wait()
+                req_id, func, args, kwargs = self.request
+                self.request = None
+            try:
+                with self.lock or nullcontext():
+                    res = func(*args, **kwargs)
+            except Exception as e:
+                res = e
+            with self.cond:
+                if req_id == self.req_id:
+                    self.result = res
+
+
+def _rss() -> None | int:
+    # resident set size of this process in bytes.
+    # the peak size is used if the current size is not available.
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB in Linux, bytes in macOS.
+    return rss if sys.platform == 'darwin' else rss*1024
+
+
+def _compile_query(query: str, fuzzy: bool) -> re.Pattern:
+    # regular expression for the file search.
+    # in the fuzzy mode, characters of the query should appear in order.
+    if fuzzy:
+        return re.compile('.*?'.join(map(re.escape, query)), re.IGNORECASE)
+    try:
+        return re.compile(query)
+    except re.error as e:
+        logger.debug(f'invalid pattern {query}: {e}. search it as a text.')
+        return re.compile(re.escape(query))
+
+
+def _fuzzy_rank(pattern: re.Pattern, path: str) -> tuple[int, int, int]:
+    # smaller is better; matches in the basename are preferred,
+    # and then shorter matches and shorter paths.
+    m = pattern.search(path, path.rfind('/')+1)
+    if m is not None:
+        return (0, m.end()-m.start(), len(path))
+    m = pattern.search(path)
+    if m is not None:
+        return (1, m.end()-m.start(), len(path))
+    return (2, 0, len(path))
+
+
+class _PathIndex():
+    # flattened paths of all directories and files.
+    # the list is made once (in a background thread if possible) and
+    # kept, and the result of the last search is kept to narrow down
+    # the next search when the query is extended.
+    def __init__(self, get_contents: GC, purepath: PPath = PurePath):
+        self.get_contents = get_contents
+        self.purepath = purepath
+        self.dirs: list[str] = []
+        self.files: list[str] = []
+        self.ready = threading.Event()
+        self.thread: None | threading.Thread = None
+        self.last: None | tuple[str, bool, list[str], list[str]] = None
+
+    def start(self) -> None:
+        # make the list in a background thread.
+        if self.thread is not None or self.ready.is_set():
+            return
+        self.thread = threading.Thread(target=self._build, daemon=True,
+                                       name='aftviewer-cui-index')
+        self.thread.start()
+
+    def _build(self) -> None:
+        dirs = []
+        files = []
+        tv = TreeViewer('.', self.get_contents,
+                        purepath=self.purepath, logger=logger)
+        try:
+            for cpath, ds, fs in tv:
+                dirs += [str(cpath/d) for d in ds]
+                files += [str(cpath/f) for f in fs]
+        except Exception as e:
+            logger.error(f'failed to list items: {e}')
+        self.dirs, self.files = dirs, files
+        logger.info(f'indexed {len(dirs)} dirs and {len(files)} files')
+        self.ready.set()
+
+    def wait(self) -> tuple[list[str], list[str]]:
+        # return all directories and files after the list is made.
+        if not self.ready.is_set():
+            if self.thread is None:
+                self._build()
+            else:
+                self.ready.wait()
+        return self.dirs, self.files
+
+    def search(self, query: str,
+               fuzzy: bool = False) -> tuple[list[str], list[str]]:
+        # return directories and files matching the query.
+        if self.last is not None and self.last[:2] == (query, fuzzy):
+            return self.last[2], self.last[3]
+        dirs, files = self.wait()
+        # matched items of the shorter query include all results.
+        if self.last is not None and self.last[1] == fuzzy and \
+           query.startswith(self.last[0]) and \
+           (fuzzy or re.escape(query) == query):
+            dirs, files = self.last[2], self.last[3]
+        pattern = _compile_query(query, fuzzy)
+        search = pattern.search
+        res_dirs = [d for d in dirs if search(d)]
+        res_files = [f for f in files if search(f)]
+        if fuzzy:
+            def rank(path):
+                return _fuzzy_rank(pattern, path)
+            res_dirs.sort(key=rank)
+            res_files.sort(key=rank)
+        self.last = (query, fuzzy, res_dirs, res_files)
+        return res_dirs, res_files
 
 
 class CursesCUI():
@@ -48,17 +748,63 @@ class CursesCUI():
         # information about selected item
         self.info = ReturnMessage('', False)
         # message shown in the main window
-        self.message: list[str] = []
+        self.message = _MessageBuffer()
         # flag if display the line number or not
         self.line_number: bool = get_config('cui_linenumber')
         # flag if wrap the message
         self.wrap: bool = get_config('cui_wrap')
         # called path-like class
         self.purepath = purepath
-        # entered key
-        self.key = ''
+        # entered key; None if no key is entered while loading an item
+        self.key: None | str = ''
         # key maps
         self.keymaps: dict[str, list] = {}
+        # load items in the background
+        self.async_load: bool = get_config('cui_async')
+        # show_func is called by one thread at a time.
+        # get_contents is locked separately (see ContentsCache).
+        self.show_lock = threading.Lock()
+        self.loader = _Loader(self.show_lock)
+        # loader of the item being loaded
+        self.load_src = self.loader
+        # path of the item being loaded
+        self.loading: None | str = None
+        self.spin_idx = 0
+        # interval to check the loaded item (ms)
+        self.poll_ms = 100
+        # rank the file search results by a fuzzy match
+        self.fuzzy: bool = get_config('cui_search_fuzzy')
+        # key entered while counting repeated keys
+        self.next_key: None | str = None
+        # cache of shown messages; (path, system, cui) -> (info, message)
+        self.cache = _MessageCache(get_config('cui_cache_size') << 20,
+                                   get_config('cui_cache_items'),
+                                   self._close_cached)
+        # number of items prefetched before and after the cursor
+        self.prefetch_num: int = get_config('cui_prefetch')
+        self.prefetcher = _Loader(self.show_lock, 'aftviewer-cui-prefetch')
+        # path of the item being prefetched
+        self.prefetching: None | str = None
+        # items are prefetched only once; failed items, items too large
+        # to cache, and items removed from the cache are not tried again.
+        self.prefetched: set[str] = set()
+        # the rest of the streamed message is read in the background
+        # to show the bottom. show_lock is held at each step of reading.
+        self.streamer = _Loader(None, 'aftviewer-cui-stream')
+        self.streaming: None | _StreamBuffer = None
+        # syntax highlighting of the shown item
+        self.highlight: bool = get_config('cui_highlight') and use_pygments
+        self.highlighter: None | _Highlighter = None
+        # token type -> curses attribute
+        self.token_attrs: dict[object, None | int] = {}
+        # show the performance overlay in the main window
+        self.hud = False
+        # last elapsed times (sec); frame, show_func of the selected item,
+        # show_func of the prefetched item, and get_contents
+        self.stats: dict[str, float] = {'frame': 0.0, 'show': 0.0,
+                                        'prefetch': 0.0, 'gc': 0.0}
+        # memoized get_contents
+        self.contents_cache: None | ContentsCache = None
 
     def init_win(self):
         self.winy, self.winx = self.stdscr.getmaxyx()
@@ -97,7 +843,7 @@ class CursesCUI():
         self.sidebar.ud = 0
         self.sidebar.lr = 0
         self.sidebar.idx = 0
-        self.sidebar.contents: list[str] = []
+        self.sidebar.contents = _SidebarItems()
         self.sidebar.scroll_h = 5
         self.sidebar.scroll_w = 3
         self.sidebar.down = self._down_sidebar
@@ -113,6 +859,7 @@ class CursesCUI():
                               updatefunc=self._update_main_window)
         self.mainwin.ud = 0
         self.mainwin.lr = 0
+        self.mainwin.seg = 0  # segment of the top line in the wrap mode
         self.mainwin.max_lr = 0
         self.mainwin.lnwidth = 0  # width of line number
         self.mainwin.textw = 0  # width that the text is shown
@@ -136,6 +883,10 @@ class CursesCUI():
         self.search.cmt = ''  # comments shown in the main window
         # ↓ find-word, line, start col, end col
         self.search.is_word: None | tuple[str, int, int, int] = None
+        # index of the current match
+        self.search.match_idx = 0
+        # all matches of the search word
+        self.search.matches: None | _MatchIndex = None
 
     def create_color_set(self, num, name):
         assert num < curses.COLOR_PAIRS, \
@@ -186,18 +937,28 @@ class CursesCUI():
         self.create_color_set(7, 'file_index')
         # search word
         self.create_color_set(8, 'search')
+        # syntax highlighting
+        if self.highlight:
+            _, bg = get_col('cui_main')
+            if bg in default_color_set:
+                bg = default_color_set[bg]
+            elif not (type(bg) is int and bg < curses.COLORS):
+                bg = -1
+            for i, col in enumerate(_syntax_colors):
+                curses.init_pair(9+i, col, bg)
         self.mainwin.b.bkgd(' ', curses.color_pair(1))
         self.topwin.b.bkgd(' ', curses.color_pair(2))
         self.sidebar.b.bkgd(' ', curses.color_pair(3))
 
     def init_var(self):
         self.info = ReturnMessage('', False)
-        self.message = []
+        self.message = _MessageBuffer()
         self.sidebar.idx = 0
         self.sidebar.ud = 0
         self.sidebar.lr = 0
         self.mainwin.ud = 0
         self.mainwin.lr = 0
+        self.mainwin.seg = 0
 
     def set_keymap(self):
         # default key maps
@@ -331,6 +1092,18 @@ class CursesCUI():
                       'jump to the previous search word',
                       True, False, False,
                       ],
+                'c': [self.cancel_load, [], 'c',
+                      'cancel opening the item or reading to the bottom',
+                      True, False, False,
+                      ],
+                ':': [self.jump_item, [], ':',
+                      'jump to the item of the index or the name prefix',
+                      True, False, True,
+                      ],
+                'P': [self.toggle_hud, [], 'P',
+                      'toggle the performance overlay',
+                      True, False, False,
+                      ],
                 }
         logger.debug('set default key maps')
         for k in def_keymaps:
@@ -378,14 +1151,7 @@ q       |quit
             return key
 
     def get_all_items(self):
-        res_dirs = []
-        res_files = []
-        tv = TreeViewer('.', self.tv.get_contents,
-                        purepath=self.purepath, logger=logger)
-        for cpath, dirs, files in tv:
-            res_dirs += [str(cpath/d) for d in dirs]
-            res_files += [str(cpath/f) for f in files]
-        return res_dirs, res_files
+        return self.index.wait()
 
     def get_title(self):
         return self.selected
@@ -452,67 +1218,385 @@ q       |quit
         if self.sidebar.lr < len_content-self.sidebar.w:
             self.sidebar.lr += self.sidebar.scroll_w
 
+    def _jump_sidebar(self, idx: int):
+        # move the cursor to the idx-th item.
+        self.sidebar.idx = idx
+        if not self.sidebar.ud <= idx < self.sidebar.ud+self.sidebar.h:
+            self.sidebar.ud = max(0, min(idx, len(self.sidebar.contents) -
+                                         self.sidebar.h))
+
     def _go_up_sidebar(self):
         if self.search.is_file:
-            self.dirs, self.files = self.tv.get_contents(self.cpath)
+            self.set_contents(*self._get_contents(self.cpath))
             self.init_var()
             self.search.is_file = False
         elif str(self.cpath) != '.':
             self.cpath = self.cpath.parent
-            self.dirs, self.files = self.tv.get_contents(self.cpath)
+            self.set_contents(*self._get_contents(self.cpath))
             self.init_var()
 
+    def _get_contents(self, cpath: PurePath) -> tuple[list[str], list[str]]:
+        # get_contents with the elapsed time recorded.
+        start = time.perf_counter()
+        res = self.tv.get_contents(cpath)
+        self.stats['gc'] = time.perf_counter()-start
+        logger.debug(f'get_contents {cpath}: {self.stats["gc"]*1e3:.1f} ms')
+        return res
+
+    def _timed_show(self, stat: str, fpath: str, **kwargs) -> object:
+        # show_func with the elapsed time recorded in self.stats[stat].
+        # this may be called in the loader threads.
+        start = time.perf_counter()
+        try:
+            return self.show_func(fpath, **kwargs)
+        finally:
+            self.stats[stat] = time.perf_counter()-start
+            logger.debug(f'show_func ({stat}) {fpath}:'
+                         f' {self.stats[stat]*1e3:.1f} ms')
+
+    def set_contents(self, dirs: list[str], files: list[str]):
+        # set the directories and files shown in the sidebar.
+        self.dirs = dirs
+        self.files = files
+        self.sidebar.contents = _SidebarItems(dirs, files)
+
     def select_item(self, system):
         self.selected = self.sidebar.contents[self.sidebar.idx]
         self.search.is_word = None
-        if self.selected in self.dirs:
+        if self.sidebar.contents.is_dir(self.sidebar.idx):
             if self.search.is_file:
                 self.cpath = self.purepath(self.selected)
             else:
                 self.cpath = self.cpath/self.selected
-            dirs, files = self.tv.get_contents(self.cpath)
-            if len(dirs+files) == 0:
-                self.message = ['empty directory.']
+            dirs, files = self._get_contents(self.cpath)
+            if len(dirs)+len(files) == 0:
+                self.message = _MessageBuffer('empty directory.')
                 self.cpath = self.cpath.parent
                 return
-            self.dirs = dirs
-            self.files = files
+            self.set_contents(dirs, files)
             self.search.is_file = False
             self.init_var()
         else:
-            if self.search.is_file:
-                fpath = self.selected
-            else:
-                fpath = str(self.cpath/self.selected)
+            fpath = self._item_path(self.sidebar.idx)
             self.mainwin.ud = 0
             self.mainwin.lr = 0
+            self.mainwin.seg = 0
+            # the item shown by an external command is not cached.
+            if not system and self._load_cache(fpath):
+                return
             # message of waiting for opening an item
-            self.message = ['opening an item...']
+            if self.async_load and self._background_ok(fpath, system):
+                # other keys are available while loading.
+                self.cancel_load()
+                if fpath == self.prefetching:
+                    # wait for the prefetch.
+                    self.load_src = self.prefetcher
+                    self.prefetching = None
+                else:
+                    # stdscr is not passed since the main thread uses it.
+                    self.loader.submit(self._timed_show, 'show', fpath,
+                                       cui=True, system=False)
+                self.loading = fpath
+                self.info = ReturnMessage('', False)
+                self._set_loading_message()
+                return
+            self.cancel_load()
+            self.message = _MessageBuffer('opening an item...')
             self.mainwin.update()
-            self.info = self.show_func(fpath, cui=True,
+            curses.doupdate()
+            with self.show_lock:
+                res = self._timed_show('show', fpath, cui=True,
                                        system=system, stdscr=self.stdscr)
-            self.message = self.info.message.split("\n")
-            self.message = [ln.replace("\t", "  ") for ln in self.message]
+            self.info = ReturnMessage.from_result(res)
+            self._set_message()
+            if not system:
+                self._save_cache(fpath)
+
+    def _background_ok(self, fpath: str, system: bool) -> bool:
+        # items using the terminal are opened in the main thread;
+        # external commands and image viewers.
+        return not system and not is_image(fpath)
+
+    def _load_cache(self, fpath: str) -> bool:
+        # show the cached message. return True if found.
+        cached = self.cache.get((fpath, False, True))
+        if cached is None:
+            return False
+        self.cancel_load()
+        self.info, self.message = cached
+        # the size of a streamed message increases after it is cached.
+        self.cache.put((fpath, False, True), cached, self.message.nbytes())
+        return True
+
+    def _close_cached(self, value: tuple[ReturnMessage, _MessageBuffer]):
+        # close the stream removed from the cache not to keep the opened
+        # files. the shown message is kept open.
+        message = value[1]
+        if isinstance(message, _StreamBuffer) and \
+           message is not self.message:
+            message.close()
+
+    def _save_cache(self, fpath: str):
+        # error messages are not cached to retry.
+        if self.info.error:
+            return
+        self.cache.put((fpath, False, True), (self.info, self.message),
+                       self.message.nbytes())
+
+    def _item_path(self, idx: int) -> str:
+        # path of the idx-th item in the sidebar.
+        if self.search.is_file:
+            return self.sidebar.contents[idx]
+        else:
+            return str(self.cpath/self.sidebar.contents[idx])
+
+    @staticmethod
+    def _make_buffer(info: ReturnMessage) -> _MessageBuffer:
+        if info.is_stream():
+            return _StreamBuffer(info)
+        else:
+            return _MessageBuffer(info.message)
+
+    def _set_message(self):
+        # set the message of self.info to the main window.
+        self.message = self._make_buffer(self.info)
+
+    def _token_attr(self, ttype) -> None | int:
+        # curses attribute of the token type based on the colors of
+        # the terminal formatter of Pygments (for dark background).
+        if ttype in self.token_attrs:
+            return self.token_attrs[ttype]
+        ctype = ttype
+        while ctype not in TERMINAL_COLORS:
+            ctype = ctype.parent
+        color = TERMINAL_COLORS[ctype][1]
+        attr = curses.A_NORMAL
+        if color.startswith('*') or color.startswith('_'):
+            attr |= curses.A_BOLD if color[0] == '*' else curses.A_UNDERLINE
+            color = color[1:-1]
+        if color.startswith('bright'):
+            attr |= curses.A_BOLD
+            color = color[6:]
+        if color == 'gray':
+            color = 'white'
+        if color in _syntax_names:
+            attr |= curses.color_pair(9+_syntax_names.index(color))
+        if attr == curses.A_NORMAL:
+            res = None
+        else:
+            res = attr
+        self.token_attrs[ttype] = res
+        return res
+
+    def _get_highlighter(self) -> None | _Highlighter:
+        # highlighter of the current message.
+        # the lexer is selected by the name of the item.
+        if not self.highlight or self.info.error or self.loading is not None:
+            return None
+        if self.highlighter is not None and \
+           self.highlighter.message is self.message:
+            return self.highlighter
+        self.highlighter = None
+        try:
+            lexer = get_lexer_for_filename(self.selected, stripnl=False)
+        except ClassNotFound:
+            return None
+        logger.debug(f'lexer of {self.selected}: {lexer.name}')
+        self.highlighter = _Highlighter(self.message, lexer,
+                                        self._token_attr)
+        return self.highlighter
+
+    def _prefetch_targets(self) -> list[str]:
+        # files around the cursor that are not cached yet,
+        # in the order of the distance from the cursor.
+        if self.prefetch_num <= 0 or not self.async_load:
+            return []
+        res = []
+        contents = self.sidebar.contents
+        for i in range(1, self.prefetch_num+1):
+            for idx in [self.sidebar.idx+i, self.sidebar.idx-i]:
+                if not 0 <= idx < len(contents) or contents.is_dir(idx):
+                    continue
+                fpath = self._item_path(idx)
+                # items using the terminal (e.g., images) have
+                # side effects, so they are opened only when selected.
+                if (fpath, False, True) not in self.cache and \
+                   fpath != self.loading and \
+                   fpath not in self.prefetched and \
+                   self._background_ok(fpath, False):
+                    res.append(fpath)
+        return res
+
+    def step_prefetch(self):
+        # prefetch the items around the cursor while waiting for keys.
+        # only one item is prefetched at a time, and it is canceled
+        # if the cursor moves away.
+        targets = self._prefetch_targets()
+        if self.prefetching is not None:
+            res = self.prefetcher.poll()
+            if res is None:
+                if self.prefetching not in targets:
+                    logger.debug(f'cancel prefetching {self.prefetching}')
+                    self.prefetcher.cancel()
+                    self.prefetching = None
+                return
+            info = None
+            if isinstance(res, Exception):
+                logger.debug(f'failed to prefetch {self.prefetching}: {res}')
+            else:
+                info = ReturnMessage.from_result(res)
+            self.prefetched.add(self.prefetching)
+            if info is not None and not info.error:
+                message = self._make_buffer(info)
+                message.fetch(self.mainwin.h)
+                if self.cache.put((self.prefetching, False, True),
+                                  (info, message), message.nbytes()):
+                    logger.debug(f'prefetched {self.prefetching}')
+                else:
+                    logger.debug(f'{self.prefetching} is not cached')
+            self.prefetching = None
+            targets = self._prefetch_targets()
+        if self.loading is not None or len(targets) == 0:
+            return
+        self.prefetching = targets[0]
+        # stdscr is not passed since the main thread uses it.
+        self.prefetcher.submit(self._timed_show, 'prefetch',
+                               self.prefetching, cui=True, system=False)
+
+    def _set_loading_message(self):
+        spin = '|/-\\'[self.spin_idx % 4]
+        self.message = _MessageBuffer(f'opening an item... {spin}\n'
+                                      'press "c" to cancel.')
+
+    def check_load(self) -> bool:
+        # check the item loaded in the background.
+        # return True if the main window should be updated.
+        if self.loading is None:
+            return False
+        res = self.load_src.poll()
+        if res is None:
+            # still loading
+            self.spin_idx += 1
+            self._set_loading_message()
+            return True
+        fpath, self.loading = self.loading, None
+        self.load_src = self.loader
+        if isinstance(res, Exception):
+            # raised in the main thread as show_func is called here.
+            logger.error(f'failed to open {fpath}: {res}')
+            raise res
+        self.info = ReturnMessage.from_result(res)
+        self.mainwin.ud = 0
+        self.mainwin.lr = 0
+        self.mainwin.seg = 0
+        self._set_message()
+        self._save_cache(fpath)
+        return True
+
+    def check_stream(self) -> bool:
+        # check the stream read in the background.
+        # return True if the main window should be updated.
+        if self.streaming is None:
+            return False
+        if self.streamer.poll() is None:
+            # the number of the read lines is updated.
+            return True
+        if self.streaming is self.message:
+            self._bottom_main()
+        self.streaming = None
+        return True
+
+    def stop_stream(self):
+        if self.streaming is None:
+            return
+        logger.info('stop reading the stream')
+        self.streaming.stop = True
+        self.streamer.cancel()
+        self.streaming = None
+
+    def cancel_load(self):
+        self.stop_stream()
+        if self.loading is None:
+            return
+        logger.info(f'cancel loading {self.loading}')
+        self.load_src.cancel()
+        self.load_src = self.loader
+        self.loading = None
+        self.info = ReturnMessage('canceled.', True)
+        self.message = _MessageBuffer(self.info.message)
+
+    def _text_width(self) -> int:
+        # width that the text is shown in the main window.
+        self.mainwin.lnwidth = len(str(len(self.message)))
+        if self.line_number:
+            textw = self.mainwin.w-self.mainwin.lnwidth-1
+        else:
+            textw = self.mainwin.w
+        self.mainwin.textw = textw-2
+        return self.mainwin.textw
 
     def _down_main(self, num: int):
+        self.message.fetch(self.mainwin.ud+num+self.mainwin.h)
         if len(self.message) == 0:
             return
+        elif self.wrap:
+            # move by segments.
+            textw = self._text_width()
+            ud, seg = self.mainwin.ud, self.mainwin.seg
+            while num > 0:
+                rest = self.message.num_segments(ud, textw)-seg-1
+                if num <= rest:
+                    seg += num
+                    break
+                elif ud >= len(self.message)-1:
+                    seg += rest
+                    break
+                num -= rest+1
+                ud += 1
+                seg = 0
+            self.mainwin.ud, self.mainwin.seg = ud, seg
         elif self.mainwin.ud < len(self.message)-num-1:
             self.mainwin.ud += num
         else:
             self.mainwin.ud = len(self.message)-1
 
     def _up_main(self, num: int):
-        if self.mainwin.ud < num:
+        if self.wrap and len(self.message) != 0:
+            textw = self._text_width()
+            ud, seg = self.mainwin.ud, self.mainwin.seg
+            while num > 0:
+                if num <= seg:
+                    seg -= num
+                    break
+                elif ud == 0:
+                    seg = 0
+                    break
+                num -= seg+1
+                ud -= 1
+                seg = self.message.num_segments(ud, textw)-1
+            self.mainwin.ud, self.mainwin.seg = ud, seg
+        elif self.mainwin.ud < num:
             self.mainwin.ud = 0
         else:
             self.mainwin.ud -= num
 
     def _bottom_main(self):
-        self.mainwin.down(len(self.message)-self.mainwin.ud-2)
+        if self.async_load and not self.message.done:
+            # other keys are available while reading the rest,
+            # and the bottom is shown after all lines are read.
+            if self.streaming is not self.message:
+                self.stop_stream()
+                self.streaming = self.message
+                self.streamer.submit(self.message.fetch_all,
+                                     self.show_lock)
+            return
+        self.message.fetch(-1)
+        self.mainwin.ud = max(0, len(self.message)-2)
+        self.mainwin.seg = 0
 
     def _top_main(self):
-        self.mainwin.up(self.mainwin.ud)
+        self.mainwin.ud = 0
+        self.mainwin.seg = 0
 
     def _shift_left_main(self, num: int):
         assert num >= 0, f'main shift left error: {num}'
@@ -541,55 +1625,74 @@ q       |quit
         # file name search mode
         uly = self.mainwin.h-self.search.h-2
         ulx = 0
-        self.mainwin.b.clear()
+        self.mainwin.invalidate()
+        self.mainwin.b.erase()
         self.mainwin.b.addstr(uly-1, ulx, 'search file name: (empty cancel)',
                               curses.A_REVERSE)
         rectangle(self.mainwin.b, uly, ulx,
                   self.search.h+uly+1, self.mainwin.w-2)
         self.mainwin.b.refresh()
-        self.search.b.clear()
+        self.search.b.erase()
         box = Textbox(self.search.b)
-        box.edit(self.editer_cmd)
+
+        def validate(key):
+            # search items every time the query is changed.
+            key = self.editer_cmd(key)
+            if key == 7:
+                return key
+            box.do_command(key)
+            self._preview_file_search(box.gather(), uly-1)
+            self.search.b.refresh()
+            return 0
+        box.edit(validate)
         search_file = box.gather()
         self.search.file = search_file.replace("\n", '').replace(" ", '')
         self.search.word = ''
         if len(self.search.file) == 0:
-            self.mainwin.b.clear()
+            self.mainwin.b.erase()
             self.mainwin.b.refresh()
         else:
-            old_files = self.files.copy()
-            old_dirs = self.dirs.copy()
-            dirs, files = self.get_all_items()
-            logger.debug('search files')
-            logger.debug(f'files: {files}')
-            logger.debug(f'dirs:  {dirs}')
-            self.files = []
-            self.dirs = []
-            for i, f in enumerate(files):
-                if re.search(self.search.file, f):
-                    self.files.append(f)
-            for i, d in enumerate(dirs):
-                if re.search(self.search.file, d):
-                    self.dirs.append(d)
-            if len(self.files)+len(self.dirs) != 0:
+            dirs, files = self.index.search(self.search.file, self.fuzzy)
+            logger.debug(f'search files: {len(dirs)} dirs and'
+                         f' {len(files)} files are found')
+            if len(files)+len(dirs) != 0:
                 # find something
+                self.set_contents(dirs, files)
                 self.search.is_file = True
                 self.init_var()
-            else:
-                self.files = old_files
-                self.dirs = old_dirs
             self.key = ''
 
+    def _preview_file_search(self, query: str, height: int):
+        # show the matched items above the search box.
+        query = query.replace("\n", '').replace(" ", '')
+        for i in range(1, height):
+            self.mainwin.b.move(i, 0)
+            self.mainwin.b.clrtoeol()
+        if len(query) == 0:
+            pass
+        elif not self.index.ready.is_set():
+            self.mainwin.b.addnstr(1, 0, 'listing items...',
+                                   self.mainwin.w-2)
+        else:
+            dirs, files = self.index.search(query, self.fuzzy)
+            self.mainwin.b.addnstr(1, 0, f'{len(dirs)+len(files)} items',
+                                   self.mainwin.w-2, curses.A_REVERSE)
+            items = chain((f'{d}/' for d in dirs), files)
+            for i, item in zip(range(2, height), items):
+                self.mainwin.b.addnstr(i, 0, item, self.mainwin.w-2)
+        self.mainwin.b.refresh()
+
     def word_search(self):
         # search mode in current file.
         uly = self.mainwin.h-self.search.h-2
         ulx = 0
+        self.mainwin.invalidate()
         self.mainwin.b.addstr(uly-1, ulx, 'search word: (empty cancel)',
                               curses.A_REVERSE)
         rectangle(self.mainwin.b, uly, ulx,
                   self.search.h+uly+1, self.mainwin.w-2)
         self.mainwin.b.refresh()
-        self.search.b.clear()
+        self.search.b.erase()
         box = Textbox(self.search.b)
         box.edit(self.editer_cmd)
         self.search.is_word = None
@@ -598,66 +1701,108 @@ q       |quit
         self.search.file = ''
         self.jump_search_word(False)
 
+    def _match_index(self) -> None | _MatchIndex:
+        # the index is kept until the word or the message is changed.
+        matches = self.search.matches
+        if matches is not None and matches.word == self.search.word and \
+           matches.message is self.message:
+            return matches
+        try:
+            self.search.matches = _MatchIndex(self.search.word, self.message)
+        except re.error as e:
+            self.search.matches = None
+            self.search.cmt = f'invalid pattern: {e}'
+        return self.search.matches
+
+    def jump_item(self):
+        # jump to the item in the sidebar by the index or the prefix.
+        uly = self.mainwin.h-self.search.h-2
+        ulx = 0
+        self.mainwin.invalidate()
+        self.mainwin.b.addstr(uly-1, ulx,
+                              'jump to index or name: (empty cancel)',
+                              curses.A_REVERSE)
+        rectangle(self.mainwin.b, uly, ulx,
+                  self.search.h+uly+1, self.mainwin.w-2)
+        self.mainwin.b.refresh()
+        self.search.b.erase()
+        box = Textbox(self.search.b)
+        box.edit(self.editer_cmd)
+        target = box.gather().replace("\n", '').strip()
+        if len(target) == 0:
+            return
+        if target.isdecimal():
+            idx = min(int(target), len(self.sidebar.contents)-1)
+        else:
+            idx = self.sidebar.contents.find(target)
+        if idx < 0:
+            self.search.cmt = f'"{target}" not found'
+            return
+        self._jump_sidebar(idx)
+
     def jump_search_word(self, reverse=False):
         if not self.search.word:
             return
+        matches = self._match_index()
+        if matches is None:
+            return
         if self.search.is_word is None:
+            # search from the top line in the window.
+            k = matches.first_after(self.mainwin.ud)
             if reverse:
-                start_line = self.mainwin.ud-1
-            else:
-                start_line = self.mainwin.ud
-            start_col = 0
-        else:
-            start_line = self.search.is_word[1]
-            if reverse:
-                start_col = self.search.is_word[2]-1
-            else:
-                start_col = self.search.is_word[3]+1
-        if reverse:
-            lines = range(start_line, -1, -1)
+                k -= 1
+        elif reverse:
+            k = self.search.match_idx-1
         else:
-            lines = range(start_line, len(self.message))
-        for i in lines:
-            if i == start_line:
-                if reverse:
-                    line = self.message[i][:start_col]
-                    shift = 0
-                else:
-                    line = self.message[i][start_col:]
-                    shift = start_col
-            else:
-                line = self.message[i]
-                shift = 0
+            k = self.search.match_idx+1
+        if not matches.has(k):
             self.search.cmt = f'"{self.search.word}" not found'
-            if reverse:
-                # find last match
-                tmpall = re.findall(self.search.word, line)
-                res = None
-                for tmpstr in tmpall:
-                    if res is None:
-                        tmpst = 0
-                    else:
-                        tmpst += res.end()
-                    res = re.search(self.search.word, line[tmpst:])
-            else:
-                tmpst = 0
-                res = re.search(self.search.word, line)
-            if res is not None:
-                found_word = res.group()
-                self.mainwin.down(i-self.mainwin.ud)
-                col = res.start()+shift+tmpst
-                if self.wrap:
-                    col = col % self.mainwin.textw
-                col -= self.mainwin.lr
-                if col < 0:
-                    self.mainwin.left(-col)
-                else:
-                    self.mainwin.right(col)
-                self.search.cmt = ''
-                self.search.is_word = (found_word, i,
-                                       shift+tmpst+res.start(),
-                                       shift+tmpst+res.end())
-                break
+            return
+        i = matches.lines[k]
+        st = self.message.expand_col(i, matches.starts[k])
+        end = self.message.expand_col(i, matches.ends[k])
+        col = st
+        if self.wrap:
+            textw = self._text_width()
+            self.mainwin.ud = i
+            self.mainwin.seg = col//textw
+            col = col % textw
+        else:
+            self.mainwin.down(i-self.mainwin.ud)
+        col -= self.mainwin.lr
+        if col < 0:
+            self.mainwin.left(-col)
+        else:
+            self.mainwin.right(col)
+        self.search.cmt = ''
+        self.search.match_idx = k
+        word = self.message.raw(i)[matches.starts[k]:matches.ends[k]]
+        self.search.is_word = (word, i, st, end)
+
+    def _active_matches(self) -> None | _MatchIndex:
+        # matches of the current search in the current message.
+        matches = self.search.matches
+        if self.search.is_word is None or matches is None or \
+           matches.message is not self.message:
+            return None
+        return matches
+
+    def step_search(self) -> bool:
+        # search the next chunk of the message while waiting for keys.
+        # return True if the main window should be updated.
+        matches = self._active_matches()
+        if matches is None or matches.done:
+            return False
+        matches.step()
+        return True
+
+    def _search_status(self) -> str:
+        # comment or the position of the current match.
+        matches = self._active_matches()
+        if self.search.cmt or matches is None:
+            return self.search.cmt
+        return f'match {self.search.match_idx+1} of {len(matches)}' + \
+            ('' if matches.done else '+')
 
     def jump_search_word_next(self):
         self.jump_search_word(False)
@@ -667,37 +1812,58 @@ q       |quit
 
     def show_search_word(self, idx: int, line_cnt: int,
                          wrap_cnt: int, lr_start: int):
-        if self.search.is_word is None:
+        # highlight all matches in the shown segment of the (idx-1)-th line.
+        matches = self._active_matches()
+        if matches is None:
             return
-        if idx-1 == self.search.is_word[1]:
-            if not self.wrap or \
-               int(self.search.is_word[2]/self.mainwin.textw) == wrap_cnt:
-                ser_st = self.search.is_word[2]-wrap_cnt*self.mainwin.textw
-                ser_st -= self.mainwin.lr
-                ser_end = self.search.is_word[3]-wrap_cnt*self.mainwin.textw
-                if self.wrap and ser_end > self.mainwin.textw:
-                    ser_end = self.mainwin.textw
-                ser_end -= self.mainwin.lr
-                if not self.wrap and ser_end > self.mainwin.textw:
-                    ser_end = self.mainwin.textw
-                if lr_start+ser_st < 0:
-                    return
-                elif ser_st > self.mainwin.textw:
-                    return
-                word_len = ser_end-ser_st
-                self.mainwin.b.addnstr(line_cnt, lr_start+ser_st,
-                                       self.search.is_word[0],
-                                       word_len,
-                                       curses.color_pair(8))
+        line = idx-1
+        textw = self.mainwin.textw
+        if self.wrap:
+            seg_st = wrap_cnt*textw
+        else:
+            seg_st = self.mainwin.lr
+        for k in matches.in_line(line):
+            st = max(self.message.expand_col(line, matches.starts[k]),
+                     seg_st)
+            end = min(self.message.expand_col(line, matches.ends[k]),
+                      seg_st+textw)
+            if st >= end:
+                continue
+            if k == self.search.match_idx:
+                attr = curses.color_pair(8) | curses.A_REVERSE
+            else:
+                attr = curses.color_pair(8)
+            self.mainwin.addnstr(line_cnt, lr_start+st-seg_st,
+                                 self.message.segment(line, st, end-st),
+                                 end-st, attr)
+
+    def show_syntax(self, highlighter: _Highlighter, idx: int,
+                    line_cnt: int, seg_st: int, lr_start: int):
+        # color the tokens in the shown segment of the idx-th line.
+        textw = self.mainwin.textw
+        for st, end, attr in highlighter.runs(idx):
+            st = max(self.message.expand_col(idx, st), seg_st)
+            end = min(self.message.expand_col(idx, end), seg_st+textw)
+            if st >= end:
+                continue
+            self.mainwin.addnstr(line_cnt, lr_start+st-seg_st,
+                                 self.message.segment(idx, st, end-st),
+                                 end-st, attr)
 
     def show_help_message(self):
-        self.message = self.create_help_msg().split('\n')
+        self.message = _MessageBuffer(self.create_help_msg())
         self.selected = '<help>'
         self.mainwin.ud = 0
         self.mainwin.lr = 0
+        self.mainwin.seg = 0
 
     def toggle_wrap(self):
         self.wrap = not self.wrap
+        self.mainwin.seg = 0
+        if self.wrap:
+            self.mainwin.lr = 0
+        # the number of segments is counted again.
+        self.message.segs.clear()
 
     def _update_side_bar(self):
         for i in range(self.sidebar.h):
@@ -705,100 +1871,146 @@ q       |quit
                 break
             cont = self.sidebar.contents[i+self.sidebar.ud]
             cidx = '{:2d} '.format(i+self.sidebar.ud)
-            if cont in self.dirs:
-                self.sidebar.b.addstr(i, 0, cidx, curses.color_pair(6))
+            if self.sidebar.contents.is_dir(i+self.sidebar.ud):
+                self.sidebar.addstr(i, 0, cidx, curses.color_pair(6))
                 attr = curses.A_BOLD
-            elif cont in self.files:
-                self.sidebar.b.addstr(i, 0, cidx, curses.color_pair(7))
+            else:
+                self.sidebar.addstr(i, 0, cidx, curses.color_pair(7))
                 attr = curses.A_NORMAL
             cont = cont[self.sidebar.lr:
                         self.sidebar.lr+self.sidebar.w-len(cidx)-1]
             if i+self.sidebar.ud == self.sidebar.idx:
-                self.sidebar.b.addstr(i, len(cidx), cont, curses.A_REVERSE)
+                self.sidebar.addstr(i, len(cidx), cont, curses.A_REVERSE)
             else:
-                self.sidebar.b.addstr(i, len(cidx), cont, attr)
+                self.sidebar.addstr(i, len(cidx), cont, attr)
 
     def _update_main_window(self):
+        # read the lines shown in the window if the message is streamed.
+        self.message.fetch(self.mainwin.ud+self.mainwin.h)
         # show title
         title = self.get_title()
-        self.mainwin.b.addnstr(0, 0, title, self.mainwin.w-1,
-                               curses.A_REVERSE)
+        self.mainwin.addnstr(0, 0, title, self.mainwin.w-1,
+                             curses.A_REVERSE)
         if len(title) == 0:
             # skip if file is not set.
+            self.show_hud()
             return
         lentitle = len(title)+2
         if self.mainwin.w > lentitle:
-            self.mainwin.b.addnstr(0, lentitle,
-                                   '{}/{}, {}; {}'.format(
-                                      self.mainwin.ud+1,
-                                      len(self.message),
-                                      self.mainwin.lr+1,
-                                      self.search.cmt,
-                                      ),
-                                   self.mainwin.w-lentitle-1,
-                                   curses.color_pair(5))
+            self.mainwin.addnstr(0, lentitle,
+                                 '{}/{}{}, {}; {}'.format(
+                                    self.mainwin.ud+1,
+                                    len(self.message),
+                                    '' if self.message.done else '+',
+                                    self.mainwin.lr+1,
+                                    self._search_status(),
+                                    ),
+                                 self.mainwin.w-lentitle-1,
+                                 curses.color_pair(5))
         if self.info.error:
             main_col = curses.color_pair(4)
         else:
             main_col = curses.color_pair(1)
         # show contents
-        self.mainwin.lnwidth = len(str(len(self.message)))
+        # only the segments in the window are sliced from the message.
+        textw = self._text_width()
+        if self.line_number:
+            lr_st = self.mainwin.lnwidth+1
+        else:
+            lr_st = 0
         self.mainwin.max_lr = 0
+        highlighter = self._get_highlighter()
+        if highlighter is not None:
+            highlighter.lex(self.mainwin.ud, self.mainwin.ud+self.mainwin.h)
         line_cnt = 1
-        for i in range(1, self.mainwin.h):
-            idx = i+self.mainwin.ud
-            if idx > len(self.message):
-                # reach the end of message
-                break
-            if self.line_number:
-                textw = self.mainwin.w-self.mainwin.lnwidth-1
-            else:
-                textw = self.mainwin.w
-            textw -= 2
-            self.mainwin.textw = textw
+        idx = self.mainwin.ud
+        seg = self.mainwin.seg if self.wrap else 0
+        while line_cnt <= self.mainwin.h-1 and idx < len(self.message):
             if self.wrap:
-                messages = [self.message[idx-1][x:x+textw]
-                            for x in range(0, len(self.message[idx-1]), textw)
-                            ]
-                if len(messages) == 0:
-                    messages = ['']
+                nseg = self.message.num_segments(idx, textw)
             else:
-                messages = [self.message[idx-1]]
-            for j, msg in enumerate(messages):
+                nseg = 1
+                linelen = self.message.line_len(idx)
+                if self.mainwin.max_lr <= linelen:
+                    self.mainwin.max_lr = linelen
+            for j in range(seg, nseg):
                 if line_cnt > self.mainwin.h-1:
                     # over the displayable line
                     break
-                if self.line_number:
-                    lr_st = self.mainwin.lnwidth+1
-                else:
-                    lr_st = 0
-                if self.mainwin.max_lr <= len(msg):
-                    self.mainwin.max_lr = len(msg)
-                msg = msg[self.mainwin.lr:]
                 try:
-                    self.mainwin.b.addnstr(line_cnt, lr_st, msg,
-                                           self.mainwin.w-2-lr_st,
-                                           main_col)
-                    self.show_search_word(idx, line_cnt, j, lr_st)
+                    if self.wrap:
+                        msg = self.message.segment(idx, j*textw, textw)
+                    else:
+                        msg = self.message.segment(idx, self.mainwin.lr,
+                                                   textw)
+                    self.mainwin.addnstr(line_cnt, lr_st, msg,
+                                         self.mainwin.w-2-lr_st,
+                                         main_col)
+                    if highlighter is not None:
+                        self.show_syntax(highlighter, idx, line_cnt,
+                                         j*textw if self.wrap else
+                                         self.mainwin.lr, lr_st)
+                    self.show_search_word(idx+1, line_cnt, j, lr_st)
                     if self.line_number:
                         if j == 0:
-                            numstr = f'{idx:0{self.mainwin.lnwidth}d}|'
+                            numstr = f'{idx+1:0{self.mainwin.lnwidth}d}|'
                         else:
                             numstr = f'{" "*self.mainwin.lnwidth}|'
-                        self.mainwin.b.addstr(line_cnt, 0, numstr)
+                        self.mainwin.addstr(line_cnt, 0, numstr)
                 except Exception as e:
-                    self.mainwin.b.addstr(line_cnt, 0,
-                                          f'!! {e}'[:self.mainwin.textw],
-                                          curses.color_pair(4))
+                    self.mainwin.addstr(line_cnt, 0,
+                                        f'!! {e}'[:self.mainwin.textw],
+                                        curses.color_pair(4))
                 line_cnt += 1
+            idx += 1
+            seg = 0
         self.search.cmt = ''
+        self.show_hud()
+
+    def toggle_hud(self):
+        self.hud = not self.hud
+        logger.debug(f'performance overlay: {self.hud}')
+
+    def show_hud(self):
+        # performance overlay at the top right of the main window.
+        if not self.hud:
+            return
+        rss = _rss()
+        hits = self.cache.hits
+        total = hits+self.cache.misses
+        lines = [
+            'frame {:.1f} ms  show {:.1f} ms  prefetch {:.1f} ms'
+            '  gc {:.1f} ms'.format(
+                self.stats['frame']*1e3, self.stats['show']*1e3,
+                self.stats['prefetch']*1e3, self.stats['gc']*1e3),
+            'message {}{} lines {:.2f} MB  rss {}'.format(
+                len(self.message), '' if self.message.done else '+',
+                self.message.nbytes()/(1 << 20),
+                '-' if rss is None else f'{rss/(1 << 20):.1f} MB'),
+            'cache {}/{} ({:.0f}%) {} items {:.1f} MB'.format(
+                hits, total, 100*hits/total if total > 0 else 0,
+                len(self.cache), self.cache.nbytes/(1 << 20)),
+            ]
+        if self.contents_cache is not None:
+            hits = self.contents_cache.hits
+            total = hits+self.contents_cache.misses
+            lines.append('contents {}/{} ({:.0f}%) {} paths'.format(
+                hits, total, 100*hits/total if total > 0 else 0,
+                len(self.contents_cache)))
+        width = min(max(map(len, lines))+2, self.mainwin.w-1)
+        for i, line in enumerate(lines):
+            if i+1 >= self.mainwin.h:
+                break
+            self.mainwin.addnstr(i+1, self.mainwin.w-1-width,
+                                 f' {line}'.ljust(width), width,
+                                 curses.color_pair(5) | curses.A_REVERSE)
 
     def _update_pwd_window(self):
         fname = str(self.fname)[-(self.topwin.w-3-6-1):]
         path = str(self.cpath)[-(self.topwin.w-5-14-1):]
-        self.topwin.b.addstr(0, 3, f'file: {fname}', curses.A_BOLD)
-        self.topwin.b.addstr(1, 5, f'current path: {path}')
-        self.topwin.b.addstr(2, 1, self.exp[:self.topwin.w-1-1])
+        self.topwin.addstr(0, 3, f'file: {fname}', curses.A_BOLD)
+        self.topwin.addstr(1, 5, f'current path: {path}')
+        self.topwin.addstr(2, 1, self.exp[:self.topwin.w-1-1])
 
     def debug_log(self):
         log_str = f'''
@@ -826,6 +2038,17 @@ is_file_search: {self.search.is_file}
 is_word_search: {self.search.is_word}
 search_file   : {self.search.file}
 search_word   : {self.search.word}
+=== cache ===
+hit/miss      : {self.cache.hits}/{self.cache.misses}
+items         : {len(self.cache)}
+size (bytes)  : {self.cache.nbytes}
+=== performance ===
+frame (ms)       : {self.stats['frame']*1e3:.1f}
+show_func (ms)   : {self.stats['show']*1e3:.1f}
+prefetch (ms)    : {self.stats['prefetch']*1e3:.1f}
+get_contents (ms): {self.stats['gc']*1e3:.1f}
+message (bytes)  : {self.message.nbytes()}
+rss (bytes)      : {_rss()}
 ==========='''
         logger.debug(log_str)
 
@@ -844,12 +2067,16 @@ search_word   : {self.search.word}
                              self.sidebar.idx, len(self.message),
                              self.mainwin.ud, self.mainwin.lr))
         self.topwin.b.addstr(2, int(self.winx*2/3), ' '*(int(self.winx/3)-1))
+        cache_str = 'c:{}/{} {}items {:.1f}MB'.format(
+                    self.cache.hits, self.cache.hits+self.cache.misses,
+                    len(self.cache), self.cache.nbytes/(1 << 20))
         if self.search.is_word is not None:
-            self.topwin.b.addnstr(2, int(self.winx*2/3), '{:d}-{:d}'.format(
-                                  self.search.is_word[1],
-                                  self.search.is_word[2]),
-                                  int(self.winx/3)-1)
-        self.topwin.b.refresh()
+            cache_str = '{:d}-{:d} '.format(self.search.is_word[1],
+                                            self.search.is_word[2]) + \
+                cache_str
+        self.topwin.b.addnstr(2, int(self.winx*2/3), cache_str,
+                              int(self.winx/3)-1)
+        self.topwin.b.noutrefresh()
 
     def add_key_maps(self, key, config):
         logger.debug(f'add key "{key}"')
@@ -863,14 +2090,22 @@ search_word   : {self.search.word}
         self.show_func = show_func
         self.cpath = cpath
         self.tv = tv
+        self.index = _PathIndex(tv.get_contents, self.purepath)
 
         # clear screen
         self.stdscr.clear()
         self.init_win()
         self.set_color()
-        self.dirs, self.files = tv.get_contents(cpath)
-        self.sidebar.contents = self.dirs+self.files
+        self.set_contents(*self._get_contents(cpath))
+        # listed after the first contents are shown.
+        if self.async_load:
+            self.index.start()
         self.set_keymap()
+        # functions applied at once for repeated keys
+        self.repeatable = [self.sidebar.down, self.sidebar.up,
+                           self.sidebar.left, self.sidebar.right,
+                           self.mainwin.down, self.mainwin.up,
+                           self.mainwin.left, self.mainwin.right]
         stdscr.refresh()
 
         while self.key != 'q':
@@ -881,10 +2116,20 @@ search_word   : {self.search.word}
                 upm, upt, ups = False, False, False
             if self.key in self.keymaps:
                 func, args, _, _, upm, upt, ups = self.keymaps[self.key]
-                func(*args)
-
-            self.sidebar.contents = self.dirs+self.files
-
+                # repeated keys are applied at once without drawing.
+                for _ in range(1+self._repeated_keys(func)):
+                    func(*args)
+            if self.check_load():
+                upm = True
+            if self.check_stream():
+                upm = True
+            if self.key is None and self.step_search():
+                upm = True
+            self.step_prefetch()
+            if self.hud:
+                upm = True
+
+            start = time.perf_counter()
             if upm:
                 self.mainwin.update()
             if upt:
@@ -893,7 +2138,57 @@ search_word   : {self.search.word}
                 self.sidebar.update()
             if GLOBAL_CONF.debug:
                 self.debug_info()
-            self.key = self.stdscr.getkey()
+            curses.doupdate()
+            if upm or upt or ups:
+                self.stats['frame'] = time.perf_counter()-start
+                if self.hud:
+                    logger.debug('frame: {:.1f} ms'.format(
+                                 self.stats['frame']*1e3))
+            self.key = self.get_key()
+
+    def _repeated_keys(self, func: Callable) -> int:
+        # count the same keys already entered (e.g., auto-repeat) for
+        # moving keys. a different key is kept for the next get_key.
+        if func not in self.repeatable:
+            return 0
+        cnt = 0
+        self.stdscr.timeout(0)
+        while True:
+            try:
+                key = self.stdscr.getkey()
+            except curses.error:
+                break
+            if key != self.key:
+                self.next_key = key
+                break
+            cnt += 1
+        return cnt
+
+    def get_key(self) -> None | str:
+        # wait for the key input.
+        if self.next_key is not None:
+            key, self.next_key = self.next_key, None
+            return key
+        # return None if the key is not entered while loading items
+        # or searching the message.
+        matches = self._active_matches()
+        searching = matches is not None and not matches.done
+        waiting = self.loading is not None or \
+            self.streaming is not None or \
+            self.prefetching is not None or \
+            len(self._prefetch_targets()) > 0
+        if searching:
+            self.stdscr.timeout(0)
+        elif waiting:
+            self.stdscr.timeout(self.poll_ms)
+        else:
+            self.stdscr.timeout(-1)
+        try:
+            return self.stdscr.getkey()
+        except curses.error:
+            if not searching and not waiting:
+                raise
+            return None
 
 
 def interactive_cui(fname: str, get_contents: GC, show_func: SF,
@@ -912,6 +2207,7 @@ def interactive_cui(fname: str, get_contents: GC, show_func: SF,
         and the second return value is a list of file names.
         In this context, a directory means something that includes
         files and directories, and a file means something that includes data.
+        The results are cached for each path (see ContentsCache).
     show_func: Callable[[str, **kwargs], ReturnMessage]
         A function to show the contents.
         The first argument is the path to a file.
@@ -920,6 +2216,9 @@ def interactive_cui(fname: str, get_contents: GC, show_func: SF,
         The return value is the ReturnMessage. It is treated as
         an error message if ReturnMessage.error is True. Otherwise, it is
         treated as a standard message.
+        The message can also be an iterable of lines, and lines are read
+        only when they are shown. Returning the iterable itself is
+        treated as a standard message.
     purepath: PurePath, PurePosixPath, or PureWindowsPath
         Specify the class to treat the path-like object.
         This is because in some case, the separator shoud be '/' not '\\'
@@ -930,8 +2229,12 @@ def interactive_cui(fname: str, get_contents: GC, show_func: SF,
     None
     """
     cpath = purepath('.')
-    tv = TreeViewer('.', get_contents, purepath=purepath, logger=logger)
     curses_cui = CursesCUI(purepath)
+    # get_contents has its own lock not to wait for show_func
+    # running in the background.
+    get_contents = cache_contents(get_contents)
+    tv = TreeViewer('.', get_contents, purepath=purepath, logger=logger)
+    curses_cui.contents_cache = get_contents
     curses_cui.disable_stream_handler()
     try:
         curses.wrapper(curses_cui.main, fname, show_func, cpath, tv)
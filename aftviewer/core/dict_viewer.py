@@ -1,22 +1,146 @@
+from __future__ import annotations
+
+import re
 import pprint
+from fnmatch import fnmatchcase
+from collections.abc import Sequence, Iterator
 from pathlib import PurePath
 from logging import getLogger
-from typing import Any
+from typing import Any, NamedTuple
 
 from . import GLOBAL_CONF, print_key, print_error, get_config
 from .types import ReturnMessage as RM
 
 logger = getLogger(GLOBAL_CONF.logname)
+# name of the virtual directory of a large sequence, e.g. [1000:2000]
+__chunk_re = re.compile(r'\[(\d+):(\d+)\]')
+
+
+class _Chunk(NamedTuple):
+    # virtual directory; a part of a sequence, seq[start:stop].
+    seq: Sequence
+    start: int
+    stop: int
+
+
+def _is_seq(data: Any) -> bool:
+    return isinstance(data, Sequence) and \
+        not isinstance(data, (str, bytes, bytearray, _Chunk))
+
+
+def _is_dir(data: Any) -> bool:
+    return isinstance(data, (dict, _Chunk)) or _is_seq(data)
+
+
+def _get_chunks(chunk: _Chunk) -> list[str]:
+    # split a chunk into virtual directories so that
+    # the number of items in one level is not larger than dict_chunk_size.
+    size = get_config('dict_chunk_size')
+    if size < 2:
+        size = 2
+    num = chunk.stop-chunk.start
+    if num <= size:
+        return []
+    step = size
+    while num > step*size:
+        step *= size
+    return [f'[{st}:{min(st+step, chunk.stop)}]'
+            for st in range(chunk.start, chunk.stop, step)]
+
+
+def _get_child(data: Any, k: str) -> tuple[bool, Any]:
+    # get the child item named k.
+    # return the flag if the item is found and the item.
+    # a virtual directory is returned as _Chunk.
+    if _is_seq(data):
+        data = _Chunk(data, 0, len(data))
+    if isinstance(data, _Chunk):
+        res = __chunk_re.fullmatch(k)
+        if res is not None:
+            st, end = int(res.group(1)), int(res.group(2))
+            if data.start <= st < end <= data.stop:
+                return True, _Chunk(data.seq, st, end)
+        elif k.isdecimal() and data.start <= int(k) < data.stop:
+            return True, data.seq[int(k)]
+    elif isinstance(data, dict):
+        if k in data:
+            return True, data[k]
+        for key in data.keys():
+            if str(key) == k:
+                return True, data[key]
+    return False, None
+
+
+def _get_item(data: Any, cpath: str) -> Any:
+    # get the item of the specified path.
+    # a virtual directory is returned as _Chunk.
+    # raise KeyError if not found, since the value itself can be None.
+    tmp_data = data
+    for k in PurePath(cpath).parts:
+        found, tmp_data = _get_child(tmp_data, k)
+        if not found:
+            logger.error(f'key not found: {cpath}, {k}')
+            raise KeyError(cpath)
+    return tmp_data
+
+
+def _has_magic(data: Any, k: str) -> bool:
+    if isinstance(data, _Chunk) or _is_seq(data):
+        if __chunk_re.fullmatch(k) is not None:
+            # name of the virtual directory.
+            return False
+    return any(c in k for c in '*?[')
+
 
+def _get_children(data: Any) -> Iterator[tuple[str, Any]]:
+    if _is_seq(data):
+        data = _Chunk(data, 0, len(data))
+    if isinstance(data, _Chunk):
+        for i in range(data.start, data.stop):
+            yield str(i), data.seq[i]
+    elif isinstance(data, dict):
+        for k, v in data.items():
+            yield str(k), v
 
-def show_keys_dict(data: dict, key: list[Any]):
+
+def _glob_item(data: Any, parts: tuple[str, ...],
+               cpath: tuple[str, ...] = ()
+               ) -> Iterator[tuple[tuple[str, ...], Any]]:
+    # yield (path, value) of items matched with the glob pattern.
+    # subtrees that do not match the pattern are not searched.
+    if len(parts) == 0:
+        yield cpath, data
+        return
+    k = parts[0]
+    if k == '**':
+        # match with zero or more levels.
+        yield from _glob_item(data, parts[1:], cpath)
+        for name, val in _get_children(data):
+            if _is_dir(val):
+                yield from _glob_item(val, parts, cpath+(name,))
+    elif _has_magic(data, k):
+        for name, val in _get_children(data):
+            if len(parts) > 1 and not _is_dir(val):
+                continue
+            if fnmatchcase(name, k):
+                yield from _glob_item(val, parts[1:], cpath+(name,))
+    else:
+        found, val = _get_child(data, k)
+        if found:
+            yield from _glob_item(val, parts[1:], cpath+(k,))
+
+
+def show_keys_dict(data: dict | Sequence, key: list[Any]):
     """
     Show the detailed information of specified keys in the dictionary.
     If key is an empty list, list all the keys in the dictionary.
+    Keys can also be paths to the nested items (e.g., "a/b/0") and
+    glob patterns (e.g., "runs/*/loss"). "**" matches any levels.
+    If data is a list or tuple, keys are indices or paths to the items.
 
     Parameters
     ----------
-    data: dict
+    data: dict or Sequence
         target data.
     key: list[Any]
         List of keys to be shown.
@@ -28,56 +152,122 @@ def show_keys_dict(data: dict, key: list[Any]):
     pargs = get_config('pp_kwargs')
     if key:
         for k in key:
-            if k in data:
+            if isinstance(data, dict) and k in data:
                 print_key(str(k))
                 pprint.pprint(data[k], **pargs)
-            else:
+                continue
+            found = False
+            for cpath, val in _glob_item(data, PurePath(str(k)).parts):
+                if isinstance(val, _Chunk):
+                    val = val.seq[val.start:val.stop]
+                print_key('/'.join(cpath))
+                pprint.pprint(val, **pargs)
+                found = True
+            if not found:
                 print_error(f'"{k}" not in this file.')
-    else:
+    elif isinstance(data, dict):
         for k in data:
             print(k)
+    else:
+        dirs, files = get_contents_dict(data, '.')
+        for k in dirs+files:
+            print(k)
 
 
-def get_item_dict(data: dict, cpath: str):
+def get_item_dict(data: dict | Sequence, cpath: str):
     """
     Get the value of the specified path.
 
     Parameters
     ----------
-    data: dict
+    data: dict or Sequence
         target data.
     cpath: str
-        path to the item. In this function, the dictionary is treated
-        like a directory, and other values are treated like files.
+        path to the item. In this function, the dictionary and the sequence
+        (list, tuple, etc.) are treated like a directory,
+        and other values are treated like files.
+        Items in the sequence are specified by the index, and
+        a large sequence is split into virtual directories
+        named like "[0:1000]".
 
     Returns
     -------
-    None
+    Any
+        The value of the specified path. If the path is not found,
+        return None.
     """
-    tmp_data = data
-    for k in PurePath(cpath).parts:
-        tmp_data_update = False
-        for key in tmp_data.keys():
-            if str(key) == k:
-                tmp_data = tmp_data[key]
-                tmp_data_update = True
-                break
-        if not tmp_data_update:
-            logger.error(f'key not found: {cpath}, {k}')
-            return None
+    try:
+        tmp_data = _get_item(data, cpath)
+    except KeyError:
+        return None
+    if isinstance(tmp_data, _Chunk):
+        return tmp_data.seq[tmp_data.start:tmp_data.stop]
     return tmp_data
 
 
-def get_contents_dict(data: dict, path: str) -> tuple[list[str], list[str]]:
+def get_child_dict(data: Any, key: str) -> Any:
+    """
+    Get the child item of the directory-like value.
+    This is faster than get_item_dict when items are traversed level by
+    level, since the path is not resolved from the top.
+
+    Parameters
+    ----------
+    data: Any
+        the parent item; a dictionary, a sequence, or a virtual directory
+        returned by this function.
+    key: str
+        name of the child item, e.g. "a", "0", or "[0:1000]".
+
+    Returns
+    -------
+    Any
+        The child item. A virtual directory of a large sequence is
+        returned as it is, and it can be passed to this function and
+        is_dir_dict.
+
+    Raises
+    ------
+    KeyError
+        If the child item is not found.
+    """
+    found, res = _get_child(data, key)
+    if not found:
+        raise KeyError(key)
+    return res
+
+
+def is_dir_dict(data: Any) -> bool:
+    """
+    Return True if the item is treated as a directory
+    (a dictionary, a sequence, or a virtual directory).
+
+    Parameters
+    ----------
+    data: Any
+        target item.
+
+    Returns
+    -------
+    bool
+        True if the item is a directory.
+    """
+    return _is_dir(data)
+
+
+def get_contents_dict(data: dict | Sequence,
+                      path: str) -> tuple[list[str], list[str]]:
     """
     Get lists of directories and files for a specified path.
     This function is available as the input to the interactive
     and interactive_cui viewers.
     See https://github.com/MeF0504/aftviewer/wiki/Extension#get_contents.
+    Sequences larger than the "dict_chunk_size" option are split into
+    virtual directories, e.g. "[0:1000]", "[1000:2000]", ...
 
     Parameters
     ----------
-    data: dict
+    data: dict or Sequence
         target data.
     path: str
         path to the item.
@@ -89,12 +279,26 @@ def get_contents_dict(data: dict, path: str) -> tuple[list[str], list[str]]:
     """
     dirs = []
     files = []
-    tmp_data = get_item_dict(data, path)
-    if tmp_data is None:
+    try:
+        tmp_data = _get_item(data, str(path))
+    except KeyError:
         return [], []
+    if _is_seq(tmp_data):
+        tmp_data = _Chunk(tmp_data, 0, len(tmp_data))
+    if isinstance(tmp_data, _Chunk):
+        # keep the order of the sequence.
+        dirs = _get_chunks(tmp_data)
+        if len(dirs) != 0:
+            return dirs, []
+        for i in range(tmp_data.start, tmp_data.stop):
+            if _is_dir(tmp_data.seq[i]):
+                dirs.append(str(i))
+            else:
+                files.append(str(i))
+        return dirs, files
     if isinstance(tmp_data, dict):
         for k in tmp_data.keys():
-            if isinstance(tmp_data[k], dict):
+            if _is_dir(tmp_data[k]):
                 dirs.append(str(k))
             else:
                 files.append(str(k))
@@ -103,7 +307,7 @@ def get_contents_dict(data: dict, path: str) -> tuple[list[str], list[str]]:
     return dirs, files
 
 
-def show_func_dict(data: dict, cpath: str, **kwargs) -> RM:
+def show_func_dict(data: dict | Sequence, cpath: str, **kwargs) -> RM:
     """
     Return the detailed information of the specified path.
     This function is available as the input to the interactive
@@ -112,7 +316,7 @@ def show_func_dict(data: dict, cpath: str, **kwargs) -> RM:
 
     Parameters
     ----------
-    data: dict
+    data: dict or Sequence
         target data.
     cpath: str
         path to the item shown.
@@ -123,9 +327,12 @@ def show_func_dict(data: dict, cpath: str, **kwargs) -> RM:
         result message. This includes the detailed information message
         of the specified path and the flag of the error message.
     """
-    tmp_data = get_item_dict(data, cpath)
+    try:
+        tmp_data = _get_item(data, cpath)
+    except KeyError:
+        return RM(f'warning! no key {cpath}', False)
+    if isinstance(tmp_data, _Chunk):
+        tmp_data = tmp_data.seq[tmp_data.start:tmp_data.stop]
     pargs = get_config('pp_kwargs')
-    if tmp_data is None:
-        return RM(f'warning! no key {cpath} or the value is None', False)
     res = pprint.pformat(tmp_data, **pargs)
     return RM(res, False)
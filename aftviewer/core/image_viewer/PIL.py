@@ -1,4 +1,5 @@
 import os
+from io import BytesIO
 from typing import Any
 
 from PIL import Image
@@ -29,3 +30,15 @@ def show_image_ndarray(data: Any, name: str) -> bool:
         return False
     else:
         return True
+
+
+def show_image_bytes(data: bytes, name: str) -> bool:
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image.show(title=name)
+    except Exception as e:
+        print_error(f'failed to open image: {name}')
+        print_error(f'{type(e).__name__}: {e}')
+        return False
+    else:
+        return True
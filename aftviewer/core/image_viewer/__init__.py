@@ -21,6 +21,9 @@ logger = getLogger(GLOBAL_CONF.logname)
 # not set, module in this package, or external command.
 __ImgViewer: None | ModuleType | str = None
 __set_ImgViewer = False
+# directory of image files made by show_image_bytes.
+# files are kept until exit since some viewers open them asynchronously.
+__tmpdir: None | tempfile.TemporaryDirectory = None
 
 
 def __get_exec_cmds(fname) -> list[str]:
@@ -283,6 +286,62 @@ def show_image_ndarray(data: Any, name: str, args: Args,
     return ret
 
 
+def show_image_bytes(data: bytes, name: str, args: Args,
+                     wait: bool = True) -> None | bool:
+    """
+    show a given encoded image data (e.g., the contents of a PNG file)
+    with the image viewer.
+
+    Parameters
+    ----------
+    data: bytes
+        The encoded image data.
+    name: str
+        The name of the image. The extension of the name is used as the
+        file type if the image viewer requires a file.
+    args: Args
+        The arguments given by the command line.
+    wait: bool
+        If true, wait to press any key after opening the image file
+        by the command.
+        Default: True
+
+    Returns
+    -------
+    bool
+        Return True if the file opened successfully and
+        False if opening file failed.
+        If a module to open the image is not found, return None.
+    """
+    global __set_ImgViewer, __ImgViewer, __tmpdir
+    logger.debug(f'img data: {name}, {len(data)} bytes')
+
+    if not __set_ImgViewer:
+        __set_image_viewer(args)
+
+    if __ImgViewer is None:
+        logger.error("I can't find any libraries to show image.")
+        return None
+    elif __ImgViewer == 'None':
+        logger.info('image viewer is None.')
+        return True
+    elif type(__ImgViewer) is ModuleType and \
+            hasattr(__ImgViewer, 'show_image_bytes'):
+        return __ImgViewer.show_image_bytes(data, name)
+
+    # the image viewer requires a file.
+    # the directory is removed at exit.
+    if __tmpdir is None:
+        __tmpdir = tempfile.TemporaryDirectory()
+        logger.debug(f'set tmp dir: {__tmpdir.name}')
+    root, ext = os.path.splitext(os.path.basename(name))
+    fd, tmpfile = tempfile.mkstemp(suffix=ext, prefix=f'{root}-',
+                                   dir=__tmpdir.name)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return show_image_file(tmpfile, args, wait)
+
+
 def is_image(path: str | os.PathLike) -> bool:
     """
     judge whether the file of a given path is an image file.
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+import codecs
+from pathlib import Path
+from logging import getLogger
+from typing import Any, Callable
+
+from . import GLOBAL_CONF
+
+logger = getLogger(GLOBAL_CONF.logname)
+
+# fast decoders; the first installed one is used.
+if 'orjson' in GLOBAL_CONF.pack_list:
+    import orjson
+    __loads: Callable[[bytes | str], Any] = orjson.loads
+    json_backend = 'orjson'
+elif 'ujson' in GLOBAL_CONF.pack_list:
+    import ujson
+    __loads = ujson.loads
+    json_backend = 'ujson'
+else:
+    __loads = json.loads
+    json_backend = 'json'
+logger.info(f'json backend: {json_backend}')
+# encodings that the fast decoders can read as bytes.
+__byte_encodings = ['utf-8', 'ascii']
+
+
+def loads_json(data: bytes | str, encoding: str = 'utf-8') -> Any:
+    """
+    Decode the JSON data.
+    A fast decoder (orjson or ujson) is used if installed,
+    otherwise the standard json module is used.
+
+    Parameters
+    ----------
+    data: bytes or str
+        JSON data. If data is bytes, it is decoded by the encoding.
+    encoding: str
+        the encoding of data.
+
+    Returns
+    -------
+    Any
+        The decoded object.
+    """
+    if isinstance(data, bytes):
+        name = codecs.lookup(encoding).name
+        if name == 'utf-8-sig':
+            if data.startswith(codecs.BOM_UTF8):
+                data = data[len(codecs.BOM_UTF8):]
+        elif name not in __byte_encodings:
+            data = data.decode(encoding)
+    if json_backend == 'json':
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+    try:
+        return __loads(data)
+    except ValueError as e:
+        # e.g. NaN, Infinity, or too large integers.
+        logger.debug(f'{json_backend} failed ({e}). use json module.')
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+def load_json(fpath: str | Path, encoding: str = 'utf-8') -> Any:
+    """
+    Load the JSON file.
+    A fast decoder (orjson or ujson) is used if installed,
+    otherwise the standard json module is used.
+
+    Parameters
+    ----------
+    fpath: str or Path
+        path to the JSON file.
+    encoding: str
+        the encoding of the file.
+
+    Returns
+    -------
+    Any
+        The decoded object.
+    """
+    with open(fpath, 'rb') as f:
+        return loads_json(f.read(), encoding)
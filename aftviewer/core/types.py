@@ -4,6 +4,7 @@ import argparse
 from dataclasses import dataclass
 from pathlib import Path
 from types import MappingProxyType
+from collections.abc import Iterable, Iterator
 from typing import Callable, Union, Optional
 
 
@@ -45,14 +46,53 @@ class ReturnMessage:
     class for returned message.
 
     Attributes:
-    message: str
-        returned message.
+    message: str or Iterable[str]
+        returned message. If an iterable (e.g., a generator) of lines
+        is set, lines are read only when they are shown.
     error: bool
         True if this message is an error.
     """
-    message: str
+    message: Union[str, Iterable[str]]
     error: bool
 
+    @classmethod
+    def from_result(cls, res: Union[ReturnMessage, Iterable[str]]
+                    ) -> ReturnMessage:
+        """
+        Convert the return value of show_func to ReturnMessage.
+        A str or an iterable of lines is treated as a standard message.
+        """
+        if isinstance(res, cls):
+            return res
+        return cls(res, False)
+
+    def is_stream(self) -> bool:
+        """
+        True if the message is an iterable of lines.
+        """
+        return not isinstance(self.message, str)
+
+    def lines(self) -> Iterator[str]:
+        """
+        Yield the lines of the message. A line break at the end of
+        each item of the iterable is removed.
+        """
+        if isinstance(self.message, str):
+            yield from self.message.split('\n')
+            return
+        for item in self.message:
+            if item.endswith('\n'):
+                item = item[:-1]
+            yield from item.split('\n')
+
+    def text(self) -> str:
+        """
+        Return the whole message as one string.
+        """
+        if isinstance(self.message, str):
+            return self.message
+        return '\n'.join(self.lines())
+
 
 class Args(argparse.Namespace):
     """
@@ -100,6 +140,6 @@ class Args(argparse.Namespace):
     output: str
 
 
-SF = Callable[..., ReturnMessage]
+SF = Callable[..., Union[ReturnMessage, Iterable[str]]]
 
 COLType = Union[str, int, None]
@@ -16,7 +16,7 @@ args_ft = [
     ('pickle', [False, True, False, True, True, True, True, True, True]),
     ('tar', [True, False, True, True, True, True, True, True, True]),
     ('zip', [True, False, True, True, True, True, True, True, True]),
-    ('jupyter', [True, True, True, True, False, False, False, False, False]),
+    ('jupyter', [True, True, True, True, False, False, False, False, True]),
     ]
 if 'hdf5' in GLOBAL_CONF.add_viewers:
     args_ft.append(('hdf5', [False, False, False, True, True, True, True,
@@ -0,0 +1,48 @@
+# test functions in aftviewer/core/contents_cache.py
+from pathlib import PurePosixPath
+
+from aftviewer.core.contents_cache import ContentsCache, cache_contents
+
+tree = {'.': (['a', 'b'], ['top.txt']),
+        'a': ([], ['x.txt', 'y.txt']),
+        'b': ([], []),
+        }
+
+
+def test_contents_cache():
+    called = []
+
+    def get_contents(path):
+        called.append(str(path))
+        return tree[str(path)]
+    gc = ContentsCache(get_contents, 2)
+    assert gc(PurePosixPath('.')) == tree['.']
+    assert gc('.') == tree['.']
+    assert gc(PurePosixPath('a')) == tree['a']
+    assert called == ['.', 'a']
+    assert (gc.hits, gc.misses) == (1, 2)
+    # '.' is the least recently used.
+    gc('b')
+    assert len(gc) == 2
+    gc('a')
+    gc('.')
+    assert called == ['.', 'a', 'b', '.']
+    gc.invalidate('a')
+    gc('a')
+    assert called[-1] == 'a'
+    gc.invalidate()
+    assert len(gc) == 0
+    assert cache_contents(gc) is gc
+
+
+def test_contents_cache_disabled():
+    called = []
+
+    def get_contents(path):
+        called.append(str(path))
+        return tree[str(path)]
+    gc = ContentsCache(get_contents, 0)
+    gc('.')
+    gc('.')
+    assert called == ['.', '.']
+    assert len(gc) == 0
@@ -12,9 +12,11 @@ from . import chk_deps
 import aftviewer.core
 from aftviewer.core import (args_chk, __load_lib, get_config, cprint,
                             get_col, print_error, print_warning, print_key,
+                            print_message,
                             __set_filetype, __get_opt_keys, __get_color_names,
                             __set_user_opts, __def_opts, __type_config,
                             __conv_col_val)
+from aftviewer.core.types import ReturnMessage
 from aftviewer.core.helpmsg import (add_args_imageviewer, add_args_encoding,
                                     add_args_output, add_args_verbose,
                                     add_args_key, add_args_interactive,
@@ -181,6 +183,15 @@ def test_print_error():
     print_error('error')
 
 
+def test_print_message(capsys):
+    print_message(ReturnMessage('a\nb', False))
+    assert capsys.readouterr().out == 'a\nb\n'
+    print_message(iter(['a\n', 'b\nc']))
+    assert capsys.readouterr().out == 'a\nb\nc\n'
+    print_message(ReturnMessage(['error'], True))
+    assert 'error' in capsys.readouterr().out
+
+
 def test_print_warning():
     # syntax check?
     print_warning('warning')
@@ -0,0 +1,542 @@
+# test functions in aftviewer/core/cui.py
+import re
+import time
+import threading
+from pathlib import PurePath
+from types import SimpleNamespace
+
+import pytest
+
+from aftviewer.core.types import ReturnMessage
+from aftviewer.core.contents_cache import ContentsCache
+from aftviewer.core.cui import (_MessageBuffer, _StreamBuffer, _PathIndex,
+                                _MatchIndex, _SidebarItems, _MessageCache,
+                                _Highlighter, _Loader, CursesCUI, CUIWin,
+                                _rss)
+import aftviewer.core.cui as cui_mod
+
+
+@pytest.mark.parametrize(('text'), [
+    '', 'a', 'a\n', '\n\n', 'abc\n\tdef\n\nxyz', 'テスト\nok\t\n',
+    ])
+def test_message_buffer(text, monkeypatch):
+    lines = [ln.replace('\t', '  ') for ln in text.split('\n')]
+    for chunk in [1, 2, 5, 1 << 20]:
+        monkeypatch.setattr(_MessageBuffer, 'chunk', chunk)
+        buf = _MessageBuffer(text)
+        assert len(buf) == len(lines)
+        assert list(buf) == lines
+        assert buf[-1] == lines[-1]
+        assert buf[1:] == lines[1:]
+    assert len(_MessageBuffer()) == 0
+    with pytest.raises(IndexError):
+        _MessageBuffer(text)[len(lines)]
+
+
+@pytest.mark.parametrize(('line'), ['abcdefghij', 'a\tb\t\tcd\te', '\t\t'])
+def test_message_segment(line):
+    buf = _MessageBuffer(f'first\n{line}')
+    expanded = line.replace('\t', '  ')
+    assert buf.line_len(1) == len(expanded)
+    for width in [1, 3, 4]:
+        for col in range(len(expanded)+2):
+            assert buf.segment(1, col, width) == \
+                expanded[col:col+width], f'{col}, {width}'
+        assert buf.num_segments(1, width) == -(-len(expanded)//width)
+    assert buf.num_segments(0, 100) == 1
+
+
+def test_stream_buffer():
+    read = []
+
+    def gen():
+        for i in range(10):
+            read.append(i)
+            yield f'line {i}\n' if i != 3 else 'a\tb\nc'
+    buf = _StreamBuffer(ReturnMessage.from_result(gen()))
+    assert len(buf) == 0 and not buf.done
+    buf.fetch(3)
+    assert read == [0, 1, 2]
+    assert buf[:] == ['line 0', 'line 1', 'line 2']
+    buf.fetch(5)
+    assert buf[3:5] == ['a  b', 'c']
+    assert buf.line_len(3) == 4
+    assert buf.segment(3, 1, 2) == '  '
+    buf.fetch(-1)
+    assert buf.done
+    assert len(buf) == 11
+    assert buf[-1] == 'line 9'
+
+    def broken():
+        yield 'ok'
+        raise ValueError('broken')
+    buf = _StreamBuffer(ReturnMessage(broken(), False))
+    buf.fetch(-1)
+    assert buf.done
+    assert buf[0] == 'ok'
+    assert 'broken' in buf[1]
+
+
+def test_stream_buffer_close():
+    closed = []
+
+    def gen():
+        try:
+            for i in range(10000):
+                yield f'line {i}'
+        finally:
+            closed.append(True)
+    buf = _StreamBuffer(ReturnMessage(gen(), False))
+    buf.fetch(5)
+    buf.close()
+    assert closed == [True]
+    assert buf.done and len(buf) == 5
+    # all lines are read step by step.
+    buf = _StreamBuffer(ReturnMessage(gen(), False))
+    assert buf.fetch_all(threading.Lock(), 100) is buf
+    assert buf.done and len(buf) == 10000
+    # stopped by the flag.
+    buf = _StreamBuffer(ReturnMessage(gen(), False))
+    buf.stop = True
+    buf.fetch(3)
+    assert len(buf) == 3
+
+
+def test_path_index():
+    tree = {'.': (['a', 'b'], ['top.txt']),
+            'a': (['c'], ['abc.txt', 'x.py']),
+            'a/c': ([], ['deep_abc.txt']),
+            'b': ([], ['bca.txt']),
+            }
+
+    def get_contents(path):
+        return tree[str(path)]
+    index = _PathIndex(get_contents)
+    index.start()
+    dirs, files = index.wait()
+    assert sorted(dirs) == ['a', 'a/c', 'b']
+    assert len(files) == 5
+    assert index.search('abc') == ([], ['a/abc.txt', 'a/c/deep_abc.txt'])
+    # narrowed from the last result.
+    assert index.search('abc.') == ([], ['a/abc.txt', 'a/c/deep_abc.txt'])
+    assert index.search('^b') == (['b'], ['b/bca.txt'])
+    assert index.search('[') == ([], [])
+    # fuzzy; matches in the basename come first.
+    assert index.search('ac', True) == (['a/c'], ['a/abc.txt',
+                                                  'a/c/deep_abc.txt'])
+    # shorter matches come first.
+    assert index.search('bt', True)[1] == ['a/abc.txt', 'a/c/deep_abc.txt',
+                                           'b/bca.txt']
+    assert index.search('ABT', True)[1] == ['a/abc.txt', 'a/c/deep_abc.txt']
+
+
+def test_find_all():
+    text = 'abc ab\n\tab\nxyz\nab'
+    pattern = re.compile('ab|c\\s+a|^x', re.MULTILINE)
+    expected = [(0, 0, 2), (0, 2, 5), (1, 1, 3), (2, 0, 1), (3, 0, 2)]
+    for buf in [_MessageBuffer(text),
+                _StreamBuffer(ReturnMessage(iter(text.split('\n')), False))]:
+        assert list(zip(*buf.find_all(pattern, 0, 10))) == expected
+        assert list(zip(*buf.find_all(pattern, 1, 3))) == expected[2:4]
+        assert buf.expand_col(1, 1) == 2
+        assert len(buf.find_all(re.compile('q*'), 0, 10)[0]) == 0
+    # matches are cut at the end of line.
+    buf = _MessageBuffer(text)
+    assert list(zip(*buf.find_all(re.compile('ab\\s+'), 0, 4))) == \
+        [(0, 4, 6), (1, 1, 3)]
+
+
+def test_match_index(monkeypatch):
+    monkeypatch.setattr(_MatchIndex, 'chunk', 3)
+    buf = _MessageBuffer('\n'.join(f'{i} a{i%4}' for i in range(20)))
+    matches = _MatchIndex('a0', buf)
+    assert matches.first_after(1) == 1
+    assert matches.searched == 6
+    assert list(matches.in_line(8)) == [2]
+    assert not matches.done
+    assert matches.has(4)
+    assert not matches.has(5)
+    assert matches.done
+    assert list(matches.lines) == [0, 4, 8, 12, 16]
+    assert matches.first_after(17) == 5
+
+
+def test_sidebar_items():
+    items = _SidebarItems(['b', 'd'], ['c', 'a', 'ba'])
+    assert list(items) == ['b', 'd', 'c', 'a', 'ba']
+    assert [items.is_dir(i) for i in range(len(items))] == \
+        [True, True, False, False, False]
+    assert items.is_dir(-4) and not items.is_dir(-1)
+    assert items[-1] == 'ba'
+    assert items.find('b') == 0
+    assert items.find('ba') == 4
+    assert items.find('c') == 2
+    assert items.find('e') == -1
+    assert items.find('bb') == -1
+    with pytest.raises(IndexError):
+        items[5]
+    assert len(_SidebarItems()) == 0
+    assert _SidebarItems().find('a') == -1
+
+
+def test_message_cache():
+    cache = _MessageCache(100, 3)
+    cache.put(('a',), 'A', 40)
+    cache.put(('b',), 'B', 40)
+    assert cache.get(('a',)) == 'A'
+    # b is the least recently used.
+    cache.put(('c',), 'C', 40)
+    assert cache.get(('b',)) is None
+    assert cache.nbytes == 80
+    cache.put(('d',), 'D', 10)
+    cache.put(('e',), 'E', 10)
+    assert len(cache) == 3
+    assert cache.get(('a',)) is None
+    # too large item is not cached.
+    cache.put(('f',), 'F', 200)
+    assert cache.get(('f',)) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert _MessageBuffer('abc').nbytes() > 0
+
+
+def test_message_cache_remove():
+    removed = []
+    cache = _MessageCache(100, 2, removed.append)
+    cache.put(('a',), 'A', 40)
+    cache.put(('a',), 'A', 50)
+    cache.put(('b',), 'B', 40)
+    assert removed == []
+    cache.put(('c',), 'C', 40)
+    assert removed == ['A']
+    cache.put(('b',), 'B2', 40)
+    assert removed == ['A', 'B']
+    assert not cache.put(('d',), 'D', 200)
+    assert removed == ['A', 'B', 'D']
+    assert cache.put(('e',), 'E', 10)
+
+
+def test_highlighter():
+    lexers = pytest.importorskip('pygments.lexers')
+    from pygments.token import Keyword, String
+    text = 'x = """a\n\tb"""\n' + 'def f():\n    pass\n'*100
+
+    def style(ttype):
+        if ttype in Keyword:
+            return 1
+        elif ttype in String:
+            return 2
+        return None
+    buf = _MessageBuffer(text)
+    hl = _Highlighter(buf, lexers.PythonLexer(stripnl=False), style)
+    hl.lex(150, 160)
+    assert set(hl.lines) == set(range(150, 160))
+    assert hl.runs(150) == [(0, 3, 1)]
+    assert hl.runs(151) == [(4, 8, 1)]
+    # a string over lines.
+    assert hl.runs(1) == [(0, 5, 2)]
+    assert hl.runs(0) == [(4, 8, 2)]
+    assert hl.runs(len(buf)-1) == []
+
+
+def test_rss():
+    rss = _rss()
+    assert rss is None or rss > 0
+
+
+def test_path_index_lock():
+    # get_contents of viewers is not entered by two threads at once.
+    entered = threading.Lock()
+    errors = []
+    tree = {'.': ([f'd{i}' for i in range(20)], ['top.txt'])}
+    for i in range(20):
+        tree[f'd{i}'] = ([], [f'f{j}' for j in range(5)])
+
+    def get_contents(path):
+        if not entered.acquire(blocking=False):
+            errors.append(str(path))
+            return [], []
+        try:
+            time.sleep(0.001)
+            return tree[str(path)]
+        finally:
+            entered.release()
+    gc = ContentsCache(get_contents, 4)
+    index = _PathIndex(gc)
+    index.start()
+    for _ in range(5):
+        for i in range(20):
+            assert gc(f'd{i}') == tree[f'd{i}']
+    assert len(index.wait()[1]) == 101
+    assert errors == []
+
+
+def _wait_for(func, timeout=5.0):
+    # call func until it returns a value other than None.
+    end = time.perf_counter()+timeout
+    while time.perf_counter() < end:
+        res = func()
+        if res is not None:
+            return res
+        time.sleep(0.001)
+    raise TimeoutError
+
+
+def test_loader():
+    lock = threading.Lock()
+    loader = _Loader(lock)
+    assert loader.poll() is None
+    # func is called with the lock.
+    loader.submit(lambda x: (x, lock.locked()), 'a')
+    assert _wait_for(loader.poll) == ('a', True)
+    assert loader.poll() is None and not loader.pending
+    # an error is returned as the result.
+
+    def error():
+        raise ValueError('broken')
+    loader.submit(error)
+    res = _wait_for(loader.poll)
+    assert isinstance(res, ValueError) and str(res) == 'broken'
+
+
+def test_loader_stale():
+    loader = _Loader()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(x):
+        started.set()
+        release.wait(5)
+        return x
+    # the cursor moves while the first item is loading.
+    loader.submit(slow, 'old')
+    assert started.wait(5)
+    loader.submit(lambda x: x, 'new')
+    release.set()
+    assert _wait_for(loader.poll) == 'new'
+    # the canceled result is dropped.
+    started.clear()
+    release.clear()
+    loader.submit(slow, 'canceled')
+    assert started.wait(5)
+    loader.cancel()
+    assert not loader.pending
+    release.set()
+    loader.submit(lambda x: x, 'next')
+    assert _wait_for(loader.poll) == 'next'
+    assert loader.poll() is None
+
+
+def _make_cui(show_func):
+    # CursesCUI without the curses windows.
+    cui = CursesCUI()
+    cui.show_func = show_func
+    cui.mainwin = SimpleNamespace(ud=3, lr=2, seg=1, h=10)
+    return cui
+
+
+def _load(cui, fpath):
+    # load fpath in the background as select_item does.
+    cui.loader.submit(cui._timed_show, 'show', fpath, cui=True,
+                      system=False)
+    cui.loading = fpath
+
+
+def test_check_load():
+    def show_func(fpath, **kwargs):
+        if fpath == 'broken.txt':
+            raise ValueError('broken')
+        return ReturnMessage(f'{fpath}\n{kwargs}', False)
+    cui = _make_cui(show_func)
+    assert not cui.check_load()
+    _load(cui, 'a.txt')
+    _wait_for(lambda: None if cui.loader.result is None else True)
+    assert cui.check_load()
+    assert cui.loading is None
+    assert cui.message[0] == 'a.txt'
+    assert "'system': False" in cui.message[1]
+    assert (cui.mainwin.ud, cui.mainwin.lr, cui.mainwin.seg) == (0, 0, 0)
+    assert ('a.txt', False, True) in cui.cache
+    # errors in the background are raised in the main thread.
+    _load(cui, 'broken.txt')
+    _wait_for(lambda: None if cui.loader.result is None else True)
+    with pytest.raises(ValueError):
+        cui.check_load()
+    assert cui.loading is None
+    assert ('broken.txt', False, True) not in cui.cache
+
+
+def test_cancel_load():
+    started = threading.Event()
+    release = threading.Event()
+
+    def show_func(fpath, **kwargs):
+        started.set()
+        release.wait(5)
+        return ReturnMessage(fpath, False)
+    cui = _make_cui(show_func)
+    _load(cui, 'slow.txt')
+    assert started.wait(5)
+    # the loading message is shown while waiting.
+    assert cui.check_load()
+    assert cui.message[0].startswith('opening an item')
+    cui.cancel_load()
+    assert cui.loading is None
+    assert cui.info.error and cui.message[0] == 'canceled.'
+    release.set()
+    # the stale result of the canceled item is not shown.
+    cui.loader.submit(lambda: 'sync')
+    assert _wait_for(cui.loader.poll) == 'sync'
+    assert not cui.check_load()
+    assert cui.message[0] == 'canceled.'
+    assert ('slow.txt', False, True) not in cui.cache
+
+
+def test_check_stream():
+    release = threading.Event()
+    closed = []
+
+    def gen(fpath):
+        try:
+            for i in range(5000):
+                if i == 100:
+                    release.wait(5)
+                yield f'{fpath} {i}'
+        finally:
+            closed.append(fpath)
+
+    def show_func(fpath, **kwargs):
+        return ReturnMessage(gen(fpath), False)
+    cui = _make_cui(show_func)
+    cui.async_load = True
+    cui.info = ReturnMessage.from_result(show_func('a.txt'))
+    cui._set_message()
+    cui.message.fetch(10)
+    # the bottom is shown after reading the rest in the background.
+    cui._bottom_main()
+    assert cui.streaming is cui.message
+    assert cui.check_stream()
+    assert cui.mainwin.ud == 3
+    release.set()
+    _wait_for(lambda: True if cui.message.done else None)
+    _wait_for(lambda: None if cui.streamer.result is None else True)
+    assert cui.check_stream()
+    assert cui.streaming is None
+    assert len(cui.message) == 5000 and cui.mainwin.ud == 4998
+    assert not cui.check_stream()
+    # reading is stopped by cancel.
+    release.clear()
+    cui.info = ReturnMessage.from_result(show_func('b.txt'))
+    cui._set_message()
+    cui._bottom_main()
+    cui.cancel_load()
+    assert cui.streaming is None
+    release.set()
+    cui.streamer.submit(lambda: 'next')
+    assert _wait_for(cui.streamer.poll) == 'next'
+    assert not cui.message.done and len(cui.message) < 5000
+    # the stream removed from the cache is closed except the shown one.
+
+    def stream(fpath):
+        buf = _StreamBuffer(show_func(fpath))
+        buf.fetch(10)
+        return buf
+    cui.cache = _MessageCache(1 << 20, 1, cui._close_cached)
+    cui.message = stream('c.txt')
+    cui.cache.put(('c.txt', False, True), (cui.info, cui.message), 0)
+    cui.cache.put(('d.txt', False, True), (cui.info, stream('d.txt')), 0)
+    assert 'c.txt' not in closed
+    cui.cache.put(('e.txt', False, True), (cui.info, stream('e.txt')), 0)
+    assert closed[-1] == 'd.txt'
+
+
+class _StubWindow():
+    # curses window recording the written rows.
+    def __init__(self, *args):
+        self.writes = []
+        self.refreshed = 0
+
+    def move(self, y, x):
+        self.writes.append(y)
+
+    def clrtoeol(self):
+        pass
+
+    def addstr(self, y, x, text, attr):
+        pass
+
+    def addnstr(self, y, x, text, num, attr):
+        pass
+
+    def noutrefresh(self):
+        self.refreshed += 1
+
+
+def test_cuiwin_update(monkeypatch):
+    monkeypatch.setattr(cui_mod.curses, 'newwin', _StubWindow)
+    texts = {'a': ['x', 'y', 'z'], 'b': ['1', '2', '3']}
+
+    def draw(name):
+        for i, text in enumerate(texts[name]):
+            wins[name].addstr(i, 0, text)
+    wins = {name: CUIWin(3, 10, 0, 0, lambda n=name: draw(n))
+            for name in texts}
+    for win in wins.values():
+        win.update()
+    assert wins['a'].b.writes == [0, 1, 2]
+    # nothing is written if the frame is not changed.
+    wins['a'].b.writes.clear()
+    wins['b'].b.writes.clear()
+    for win in wins.values():
+        win.update()
+    assert wins['a'].b.writes == [] and wins['b'].b.writes == []
+    # only the changed row of the changed window is written.
+    texts['b'][1] = '22'
+    for win in wins.values():
+        win.update()
+    assert wins['a'].b.writes == [] and wins['b'].b.writes == [1]
+    wins['a'].invalidate()
+    wins['a'].update()
+    assert wins['a'].b.writes == [0, 1, 2]
+
+
+def test_step_prefetch():
+    called = []
+
+    def show_func(fpath, **kwargs):
+        called.append(fpath)
+        return ReturnMessage(fpath*1000 if fpath == 'big.txt' else fpath,
+                             False)
+    cui = _make_cui(show_func)
+    cui.async_load = True
+    cui.prefetch_num = 2
+    cui.cpath = PurePath('.')
+    cui.search = SimpleNamespace(is_file=False)
+    files = ['a.txt', 'big.txt', 'c.txt', 'd.txt']
+    cui.sidebar = SimpleNamespace(contents=_SidebarItems([], files), idx=0)
+    # one small item is cached.
+    cui.cache = _MessageCache(2000, 1, cui._close_cached)
+
+    def prefetch_all():
+        for _ in range(5000):
+            cui.step_prefetch()
+            if cui.prefetching is None and \
+               len(cui._prefetch_targets()) == 0:
+                return
+            time.sleep(0.001)
+        raise TimeoutError
+    # the item too large to cache is not loaded again.
+    prefetch_all()
+    assert called == ['big.txt', 'c.txt']
+    assert ('big.txt', False, True) not in cui.cache
+    assert ('c.txt', False, True) in cui.cache
+    # neither are the items removed from the cache by other items.
+    cui.sidebar.idx = 2
+    prefetch_all()
+    assert called == ['big.txt', 'c.txt', 'd.txt', 'a.txt']
+    assert ('d.txt', False, True) not in cui.cache
+    for _ in range(10):
+        cui.step_prefetch()
+    assert cui.prefetching is None
+    assert len(called) == 4
+    # prefetching does not change the time of the shown item.
+    assert cui.stats['show'] == 0.0 and cui.stats['prefetch'] > 0.0
@@ -0,0 +1,112 @@
+# test functions in aftviewer/core/dict_viewer.py
+import pytest
+
+from aftviewer.core import __set_user_opts
+from aftviewer.core.dict_viewer import (get_item_dict, get_contents_dict,
+                                        show_func_dict, show_keys_dict,
+                                        _glob_item)
+
+data = {
+        'a': 1,
+        'b': {'c': [10, 11, {'d': 'e'}], 'f': (1, 2)},
+        3: 'int key',
+        'long': list(range(25)),
+        }
+
+
+@pytest.mark.parametrize(('path', 'expected'), [
+    ('a', 1),
+    ('3', 'int key'),
+    ('b/c/1', 11),
+    ('b/c/2/d', 'e'),
+    ('b/f', (1, 2)),
+    ('long/[4:8]', [4, 5, 6, 7]),
+    ('long/[4:8]/6', 6),
+    ('long/24', 24),
+    ('b/c/3', None),
+    ('long/[4:30]', None),
+    ('long/[4:8]/8', None),
+    ('x', None),
+    ])
+def test_get_item_dict(path, expected):
+    __set_user_opts({'defaults': {'dict_chunk_size': 4}}, None)
+    assert get_item_dict(data, path) == expected, f'{path}'
+
+
+def test_get_contents_dict():
+    __set_user_opts({'defaults': {'dict_chunk_size': 4}}, None)
+    dirs, files = get_contents_dict(data, '.')
+    assert dirs == ['b', 'long']
+    assert files == ['3', 'a']
+    dirs, files = get_contents_dict(data, 'b/c')
+    assert dirs == ['2']
+    assert files == ['0', '1']
+    # 25 items -> 2 levels of virtual directories.
+    dirs, files = get_contents_dict(data, 'long')
+    assert dirs == ['[0:16]', '[16:25]']
+    assert files == []
+    dirs, files = get_contents_dict(data, 'long/[16:25]')
+    assert dirs == ['[16:20]', '[20:24]', '[24:25]']
+    assert files == []
+    dirs, files = get_contents_dict(data, 'long/[16:25]/[20:24]')
+    assert dirs == []
+    assert files == ['20', '21', '22', '23']
+    assert get_contents_dict(data, 'a') == ([], [])
+    assert get_contents_dict(data, 'x') == ([], [])
+    # sequence at the top level.
+    assert get_contents_dict([1, [2]], '.') == (['1'], ['0'])
+
+
+def test_show_func_dict():
+    __set_user_opts({'defaults': {'dict_chunk_size': 4}}, None)
+    assert show_func_dict(data, 'b/c/2/d').message == "'e'"
+    assert show_func_dict(data, 'long/[4:8]').message == '[4, 5, 6, 7]'
+    # None is a value, not a missing key.
+    assert show_func_dict({'n': None}, 'n').message == 'None'
+    assert 'no key' in show_func_dict({'n': None}, 'x').message
+
+
+def test_show_keys_dict():
+    __set_user_opts({'defaults': {'dict_chunk_size': 4}}, None)
+    # syntax check?
+    show_keys_dict(data, [])
+    show_keys_dict(data, ['a', 'x'])
+    show_keys_dict(list(range(10)), [])
+    show_keys_dict(list(range(10)), ['[0:4]/3', '5'])
+
+
+def test_show_keys_dict_none(capsys):
+    show_keys_dict({'a': {'b': None}, 'n': None}, ['a/b', 'n', 'a/x'])
+    captured = capsys.readouterr()
+    assert captured.out.count('None') == 2
+    assert '"a/x" not in this file.' in captured.out+captured.err
+    assert 'a/b' not in captured.err
+
+
+@pytest.mark.parametrize(('pattern', 'expected'), [
+    ('a', [('a',)]),
+    ('b/c/1', [('b', 'c', '1')]),
+    ('b/*', [('b', 'c'), ('b', 'f')]),
+    ('b/?/0', [('b', 'c', '0'), ('b', 'f', '0')]),
+    ('*/c/2/d', [('b', 'c', '2', 'd')]),
+    ('**/d', [('b', 'c', '2', 'd')]),
+    ('long/[4:8]/[56]', [('long', '[4:8]', '5'), ('long', '[4:8]', '6')]),
+    ('long/2[34]', [('long', '23'), ('long', '24')]),
+    ('*/x', []),
+    ('a/*', []),
+    ])
+def test_glob_item(pattern, expected):
+    __set_user_opts({'defaults': {'dict_chunk_size': 4}}, None)
+    res = [cpath for cpath, _ in _glob_item(data, tuple(pattern.split('/')))]
+    assert res == expected, f'{pattern}'
+
+
+def test_show_keys_dict_glob(capsys):
+    __set_user_opts({'defaults': {'dict_chunk_size': 4}}, None)
+    runs = {'runs': {f'r{i}': {'metrics': {'loss': i, 'acc': -i}}
+                     for i in range(3)}}
+    show_keys_dict(runs, ['runs/*/metrics/loss'])
+    out = capsys.readouterr().out
+    for i in range(3):
+        assert f'runs/r{i}/metrics/loss' in out
+    assert 'acc' not in out
@@ -0,0 +1,29 @@
+# test functions in aftviewer/core/json_loader.py
+import codecs
+
+import pytest
+
+from aftviewer.core.json_loader import loads_json, load_json
+
+data = {'a': [1, 2.5, None, True], 'b': 'テスト'}
+text = '{"a": [1, 2.5, null, true], "b": "テスト"}'
+
+
+@pytest.mark.parametrize(('encoding'), ['utf-8', 'utf-8-sig', 'utf-16',
+                                        'shift_jis', 'euc-jp'])
+def test_loads_json(encoding):
+    assert loads_json(text.encode(encoding), encoding) == data
+    assert loads_json(text, encoding) == data
+
+
+def test_loads_json_fallback():
+    # not supported by some fast decoders.
+    assert str(loads_json(b'[NaN, 1e400]')) == '[nan, inf]'
+    with pytest.raises(ValueError):
+        loads_json(b'{"a": ')
+
+
+def test_load_json(tmp_path):
+    fpath = tmp_path/'test.json'
+    fpath.write_bytes(codecs.BOM_UTF8+text.encode('utf-8'))
+    assert load_json(fpath, 'utf-8-sig') == data
@@ -0,0 +1,287 @@
+# test functions in aftviewer/viewers/jupyter.py
+import io
+import os
+import re
+import json
+import base64
+import time
+
+import pytest
+
+import aftviewer.viewers.jupyter as jupyter
+from aftviewer.viewers.jupyter import (NotebookStream, ImageOutputs,
+                                      batch_convert, get_cell_names,
+                                      show_cell, truncate_output, CellSize,
+                                      size_report, select_cells,
+                                      show_output)
+
+cells = [
+        {'cell_type': 'markdown', 'metadata': {}, 'source': ['# title']},
+        {'cell_type': 'code', 'execution_count': 1,
+         'metadata': {'tags': ['"]}', '{[']},
+         'outputs': [{'name': 'stdout', 'output_type': 'stream',
+                      'text': ['a\\"b\n', 'テスト\n']}],
+         'source': ['print("a\\"b")\n', 'print("テスト")']},
+        {'cell_type': 'code', 'execution_count': None,
+         'metadata': {}, 'outputs': [], 'source': []},
+        ]
+metadata = {'kernelspec': {'display_name': 'Python 3'},
+            'language_info': {'name': 'python', 'version': '3.12'}}
+
+
+@pytest.fixture(params=['cells_first', 'metadata_first'])
+def notebook(request, tmp_path):
+    if request.param == 'cells_first':
+        data = {'cells': cells, 'metadata': metadata,
+                'nbformat': 4, 'nbformat_minor': 5}
+    else:
+        data = {'metadata': metadata, 'nbformat': 4, 'cells': cells}
+    fpath = tmp_path/'test.ipynb'
+    with open(fpath, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+    return fpath
+
+
+@pytest.mark.parametrize(('bufsize'), [1, 16, 1 << 20])
+def test_notebook_stream(notebook, bufsize):
+    nb = NotebookStream(notebook, 'utf-8', bufsize)
+    assert nb.metadata() == metadata
+    assert nb.count() == len(cells)
+    assert list(nb) == cells
+
+
+def test_notebook_tail_metadata(notebook, tmp_path):
+    # metadata of cells is not taken as the notebook metadata.
+    assert NotebookStream(notebook, 'utf-8')._tail_metadata() in \
+        [metadata, None]
+    # long cells after the metadata; searched from the beginning.
+    fpath = tmp_path/'long.ipynb'
+    with open(fpath, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': metadata, 'nbformat': 4,
+                   'cells': cells*1000}, f)
+    nb = NotebookStream(fpath, 'utf-8')
+    assert nb._tail_metadata() is None
+    assert nb.metadata() == metadata
+
+
+def test_notebook_metadata_value(tmp_path):
+    # "metadata" appears as a value after the top-level metadata.
+    tagged = [{'cell_type': 'markdown', 'metadata': {'tags': ['metadata']},
+               'source': ['"metadata"']}]
+    fpath = tmp_path/'test.ipynb'
+    with open(fpath, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': metadata, 'nbformat': 4, 'cells': tagged}, f)
+    nb = NotebookStream(fpath, 'utf-8')
+    assert nb.metadata() == metadata
+    assert list(nb) == tagged
+
+
+@pytest.mark.parametrize(('encoding'), ['utf-8', 'utf-16'])
+def test_notebook_cell(tmp_path, encoding):
+    fpath = tmp_path/'test.ipynb'
+    with open(fpath, 'w', encoding=encoding) as f:
+        json.dump({'cells': cells, 'metadata': metadata}, f)
+    nb = NotebookStream(fpath, encoding, 16)
+    assert len(nb.index()) == len(cells)
+    for i in reversed(range(len(cells))):
+        assert nb.cell(i) == cells[i]
+
+
+def test_select_cells(notebook):
+    index = NotebookStream(notebook, 'utf-8', 8).index()
+    assert [(pos.cell_type, pos.exec_count) for pos in index] == \
+        [('markdown', None), ('code', 1), ('code', None)]
+    assert select_cells(index, ['2'], None) == [1]
+    assert select_cells(index, ['2:'], None) == [1, 2]
+    assert select_cells(index, [':2', '3:10'], None) == [0, 1, 2]
+    assert select_cells(index, None, [1]) == [1]
+    for spec in ['0', '4', 'a', '3:2']:
+        with pytest.raises(ValueError):
+            select_cells(index, [spec], None)
+    with pytest.raises(ValueError):
+        select_cells(index, None, [2])
+
+
+def test_show_cell(notebook):
+    nb = NotebookStream(notebook, 'utf-8')
+    names = get_cell_names(nb.count())
+    assert names == ['cell1', 'cell2', 'cell3']
+    names_dict = {name: i for i, name in enumerate(names)}
+    res = show_cell(nb, names_dict, None, ImageOutputs(nb), None, None,
+                    'cell2')
+    assert not res.error
+    assert 'print("テスト")' in res.message
+    assert 'テスト' in res.message.splitlines()[-1]
+    assert show_cell(nb, names_dict, None, ImageOutputs(nb), None, None,
+                     'cell4').error
+
+
+def test_notebook_stream_no_tail(notebook):
+    # metadata is searched from the beginning.
+    nb = NotebookStream(notebook, 'utf-8', 4)
+    nb._tail_metadata = lambda: None
+    assert nb.metadata() == metadata
+
+
+def test_notebook_stream_broken(tmp_path):
+    fpath = tmp_path/'broken.ipynb'
+    with open(fpath, 'w') as f:
+        f.write('{"cells": [{"cell_type": "code"}, {"cell_')
+    nb = NotebookStream(fpath, 'utf-8', 4)
+    with pytest.raises(ValueError):
+        list(nb)
+
+
+def test_image_outputs(tmp_path):
+    outputs = [{'output_type': 'display_data',
+                'data': {'image/png': code, 'text/plain': ['<Figure>']}}
+               for code in ['aW1hZ2Ux', 'aW1hZ2Uy', ['aW1h', 'Z2Ux']]]
+    fpath = tmp_path/'test.ipynb'
+    with open(fpath, 'w', encoding='utf-8') as f:
+        json.dump({'cells': [{'cell_type': 'code', 'execution_count': 1,
+                              'metadata': {}, 'outputs': outputs,
+                              'source': []}],
+                   'metadata': metadata}, f)
+    images = ImageOutputs(NotebookStream(fpath, 'utf-8'))
+    for j, output in enumerate(outputs):
+        images.add('image/png', output['data']['image/png'], 0, j)
+    # same image is registered once.
+    assert images.images == [('image/png', 0, 0), ('image/png', 0, 1)]
+    # the data is read from the file.
+    assert base64.b64decode(images.read(1)) == b'image1'
+    assert base64.b64decode(images.read(2)) == b'image2'
+
+
+def test_batch_convert(notebook, tmp_path):
+    broken = tmp_path/'broken.ipynb'
+    with open(broken, 'w') as f:
+        f.write('{"cells": [{"cell_type": "code"}, {"cell_')
+    sub = tmp_path/'sub'
+    sub.mkdir()
+    other = sub/notebook.name
+    other.write_bytes(notebook.read_bytes())
+    outdir = tmp_path/'out'
+    res = batch_convert([notebook, other, broken], outdir, 'utf-8', 2)
+    assert res == 1
+    assert sorted(p.name for p in outdir.iterdir()) == ['test.py', 'test_1.py']
+    script = (outdir/'test.py').read_text()
+    assert script.startswith('#! /usr/bin/env python3\n')
+    assert '# markdown' in script
+    assert 'print("テスト")' in script
+    assert script == (outdir/'test_1.py').read_text()
+
+
+def test_output_names(tmp_path):
+    files = [tmp_path/f'd{i}'/'a.ipynb' for i in range(2000)]
+    files += [tmp_path/'a_1.ipynb', tmp_path/'b.ipynb', files[0]]
+    dsts = jupyter._output_names(files, tmp_path)
+    assert len(dsts) == 2002
+    assert len(set(dsts.values())) == 2002
+    assert dsts[files[0]].name == 'a.py'
+    assert dsts[files[1]].name == 'a_1.py'
+    assert dsts[files[1999]].name == 'a_1999.py'
+    assert dsts[tmp_path/'a_1.ipynb'].name == 'a_1_1.py'
+    assert dsts[tmp_path/'b.ipynb'].name == 'b.py'
+
+
+def test_truncate_output():
+    texts = [f'line {i}\n' for i in range(1000)]
+    assert truncate_output(texts, None) == texts
+    assert truncate_output(texts[:10], (10, 0)) == texts[:10]
+    assert truncate_output('a\nb\n', (10, 0)) == ['a\n', 'b\n']
+    res = truncate_output(texts, (10, 0))
+    assert res[:5] == texts[:5]
+    assert res[-5:] == texts[-5:]
+    assert '990 lines are omitted' in res[5]
+    # limited by bytes.
+    res = truncate_output(texts, (0, 40))
+    assert res[:2] == texts[:2]
+    assert res[-2:] == texts[-2:]
+    assert '996 lines are omitted' in res[2]
+    # a long line.
+    res = truncate_output(['a'*100+'b'*100], (10, 20))
+    assert res == ['a'*10+'\n', '... output is truncated'
+                   ' (use --full_output to show all) ...\n', 'b'*10+'\n']
+    res = truncate_output(['x'*100+'\n'], (10, 40))
+    assert res[0] == 'x'*20+'\n' and res[-1] == 'x'*19+'\n'
+
+
+@pytest.mark.parametrize(('texts'), [
+    ['x'*100], ['x'*100+'\n'], [f'line {i}\n' for i in range(100)],
+    ['a\n', 'b'*100, 'c\n'],
+    ])
+def test_truncated_script(texts):
+    # every line of the output is commented out in the --output script.
+    out = io.StringIO()
+    show_output({'output_type': 'stream', 'name': 'stdout', 'text': texts},
+                '# ', out, None, (10, 40), 0, 0)
+    lines = out.getvalue().splitlines()
+    assert any('--full_output' in line for line in lines)
+    assert all(line.startswith('# ') for line in lines if line != '')
+    compile(out.getvalue(), 'script', 'exec')
+
+
+def test_size_report(notebook, capsys):
+    png = base64.b64encode(b'x'*100).decode()
+    cell = {'cell_type': 'code', 'execution_count': 3, 'source': 'a = 1',
+            'outputs': [{'output_type': 'display_data',
+                         'data': {'image/png': png,
+                                  'text/plain': ['<Figure>']}},
+                        {'output_type': 'error',
+                         'traceback': ['Error', 'é']}]}
+    cell_size = CellSize(4, cell, 1000)
+    assert cell_size.sizes == {'source': 5, 'text': 15,
+                               'image/png': len(png)}
+    assert cell_size.decoded == {'image/png': 100}
+    assert cell_size.label() == 'cell 5 (In [3])'
+    # attachments of a markdown cell.
+    att = base64.b64encode(b'y'*30000).decode()
+    cell = {'cell_type': 'markdown', 'metadata': {},
+            'source': ['![a.png](attachment:a.png)'],
+            'attachments': {'a.png': {'image/png': att},
+                            'b.svg': {'image/svg+xml': ['<svg>', '</svg>']}}}
+    cell_size = CellSize(0, cell, 50000)
+    assert cell_size.sizes == {'source': 26, 'image/png': len(att),
+                               'text': 11}
+    assert cell_size.decoded == {'image/png': 30000}
+    size_report(NotebookStream(notebook, 'utf-8'), 1)
+    out = capsys.readouterr().out
+    assert '3 cells' in out
+    assert 'cell 2 (In [1])' in out
+
+
+def test_highlight_cache(tmp_path):
+    cache = jupyter._HighlightCache(tmp_path, 100)
+    assert cache.get('ab01') is None
+    cache.put('ab01', 'x'*40)
+    assert cache.get('ab01') == 'x'*40
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.put('cd02', 'y'*40)
+    # ab01 is read again, so cd02 is the least recently used.
+    old = time.time()-100
+    os.utime(tmp_path/'cd'/'cd02', (old, old))
+    assert cache.get('ab01') == 'x'*40
+    cache.put('ef03', 'z'*40)
+    assert cache.get('cd02') is None
+    assert cache.get('ab01') == 'x'*40
+    assert cache.get('ef03') == 'z'*40
+    # no limit.
+    cache = jupyter._HighlightCache(tmp_path, 0)
+    cache.put('gh04', 'w'*400)
+    assert cache.get('ef03') == 'z'*40
+
+
+def test_highlight_blank_lines(monkeypatch):
+    pygments = pytest.importorskip('pygments')
+    from pygments.lexers import get_lexer_by_name
+    from pygments.formatters import TerminalFormatter
+    # enable Pygments, which is not listed in GLOBAL_CONF in tests.
+    monkeypatch.setattr(jupyter, 'use_pygments', True)
+    monkeypatch.setattr(jupyter, 'highlight', pygments.highlight,
+                        raising=False)
+    monkeypatch.setattr(jupyter, 'get_lexer_by_name', get_lexer_by_name,
+                        raising=False)
+    lexer = jupyter.get_lexer('python', {})
+    for src in ['\n\nx = 1\n\n', 'x = 1\n\n!ls\n\ny = 2']:
+        res = jupyter.syntax_cell(src, '', lexer, TerminalFormatter())
+        assert re.sub('\x1b\\[[0-9;]*m', '', res) == src
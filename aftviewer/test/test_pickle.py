@@ -0,0 +1,41 @@
+# test functions in aftviewer/viewers/pickle.py
+from functools import partial
+
+from pymeflib.tree2 import show_tree
+
+from aftviewer.core import __set_user_opts
+from aftviewer.core.dict_viewer import get_contents_dict
+from aftviewer.viewers.pickle import VerboseInfo
+
+data = {
+        'a': 1,
+        'b': {'c': [10, 'x'*100, {'d': None}]},
+        'long': list(range(10)),
+        }
+
+
+def test_verbose_info():
+    __set_user_opts({'defaults': {'dict_chunk_size': 4},
+                     'pickle': {'verbose_max_len': 20}}, None)
+    info = VerboseInfo(data)
+    assert info('f.pkl') == ('', '')
+    assert info('f.pkl/a') == ('', ' :1')
+    assert info('f.pkl/b') == ('', '')
+    assert info('f.pkl/b/c/2/d') == ('', ' :None')
+    # long values are cut.
+    val = info('f.pkl/b/c/1')[1]
+    assert val.startswith(" :'xxx") and len(val) == 2+20
+    assert info('f.pkl/long/[8:10]/9') == ('', ' :9')
+    assert info('f.pkl/x') == ('', '')
+
+
+def test_verbose_tree(capsys):
+    __set_user_opts({'defaults': {'dict_chunk_size': 4},
+                     'pickle': {'verbose_max_len': 20}}, None)
+    show_tree('f.pkl', partial(get_contents_dict, data),
+              add_info=VerboseInfo(data))
+    out = capsys.readouterr().out
+    assert 'a :1' in out
+    assert 'd :None' in out
+    assert '9 :9' in out
+    assert 'x'*20 not in out
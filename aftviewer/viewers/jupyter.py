@@ -1,21 +1,30 @@
 from __future__ import annotations
 
+import io
 import os
+import re
 import sys
 import json
+import codecs
 import base64
-import tempfile
-from pathlib import Path
+import heapq
+import hashlib
+from pathlib import Path, PurePath
+from functools import partial
 from logging import getLogger
-from typing import Any
+from typing import Any, BinaryIO, Iterator, NamedTuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from .. import (GLOBAL_CONF, Args, args_chk, cprint, show_image_file,
-                print_error, get_config, get_col, help_template,
-                add_args_imageviewer, add_args_output, add_args_verbose,
-                add_args_encoding)
+from .. import (GLOBAL_CONF, Args, args_chk, cprint, show_image_bytes,
+                print_key, print_error, get_config, get_col, help_template,
+                load_json, loads_json,
+                interactive_cui,
+                add_args_imageviewer, add_args_output,
+                add_args_specification, add_args_encoding)
+from .. import ReturnMessage as RM
 
 if 'Pygments' in GLOBAL_CONF.pack_list:
-    from pygments import highlight
+    from pygments import highlight, __version__ as pygments_version
     from pygments.lexer import Lexer
     from pygments.lexers import get_lexer_by_name
     from pygments.formatters import TerminalFormatter, Terminal256Formatter
@@ -28,44 +37,589 @@ logger = getLogger(GLOBAL_CONF.logname)
 logger.info(f'use_pygments: {use_pygments}')
 
 
-def show_output(output: dict[str, Any], args: Args, cnt: str,
-                out_obj, tmpdir: tempfile.TemporaryDirectory):
-    if out_obj == sys.stdout:
-        header = ''
+class LocalArgs(Args):
+    language: None | str
+    batch: None | list[str]
+    jobs: None | int
+    full_output: bool
+    size_report: None | int
+    cell: None | list[str]
+    exec_count: None | list[int]
+
+
+# encodings that JSON structural characters can be found in bytes.
+_stream_encodings = ['utf-8', 'utf-8-sig', 'ascii', 'iso8859-1']
+_ws_re = re.compile(rb'[ \t\n\r]*')
+_str_re = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_struct_re = re.compile(rb'[\[\]{}"]')
+_scalar_re = re.compile(rb'[^,:\[\]{}" \t\n\r]+')
+_colon_re = re.compile(r'\s*:\s*')
+# maximum length of the text after the top-level metadata;
+# only short values like "nbformat" follow it.
+_tail_rest_max = 1 << 12
+
+
+class _JSONReader():
+    # read a JSON file from the beginning piece by piece.
+    def __init__(self, f: BinaryIO, encoding: str, bufsize: int):
+        self.f = f
+        self.f.seek(0)
+        self.encoding = encoding
+        self.bufsize = bufsize
+        self.buf = b''
+        self.pos = 0  # current position in buf.
+        self.start = 0  # start position of the value skipped last.
+        self.offset = 0  # file position of buf[0].
+        self.eof = False
+        self.more()
+        if self.buf.startswith(codecs.BOM_UTF8):
+            self.pos = len(codecs.BOM_UTF8)
+
+    def more(self) -> None:
+        # drop the data before pos and read the next data.
+        # the size of the data read is doubled to keep the cost linear.
+        if self.eof:
+            raise ValueError('invalid notebook: unexpected end of file.')
+        rest = self.buf[self.pos:]
+        data = self.f.read(max(self.bufsize, len(rest)))
+        if len(data) == 0:
+            self.eof = True
+        self.offset += self.pos
+        self.buf = rest+data
+        self.pos = 0
+
+    def peek(self) -> bytes:
+        # skip white spaces and return the next character.
+        while True:
+            self.pos = _ws_re.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos+1]
+            self.more()
+
+    def expect(self, chars: bytes) -> bytes:
+        c = self.peek()
+        if len(c) == 0 or c not in chars:
+            raise ValueError(f'invalid notebook: {chars!r} is expected'
+                             f' at {self.offset+self.pos} but got {c!r}.')
+        self.pos += 1
+        return c
+
+    def _find_end(self) -> int:
+        # return the end position of the value starting at pos.
+        # return -1 if the value is not in the buffer.
+        buf = self.buf
+        c = buf[self.pos:self.pos+1]
+        if c == b'"':
+            m = _str_re.match(buf, self.pos)
+            return -1 if m is None else m.end()
+        elif c in (b'[', b'{'):
+            depth = 0
+            idx = self.pos
+            while True:
+                m = _struct_re.search(buf, idx)
+                if m is None:
+                    return -1
+                c = m.group()
+                if c == b'"':
+                    m = _str_re.match(buf, m.start())
+                    if m is None:
+                        return -1
+                elif c in b'[{':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return m.end()
+                idx = m.end()
+        else:
+            m = _scalar_re.match(buf, self.pos)
+            if m is None:
+                raise ValueError('invalid notebook: unexpected character'
+                                 f' {c!r} at {self.offset+self.pos}.')
+            elif m.end() == len(buf) and not self.eof:
+                return -1
+            return m.end()
+
+    def skip(self) -> tuple[int, int]:
+        # skip the next value and return its file positions.
+        self.peek()
+        while True:
+            end = self._find_end()
+            if end >= 0:
+                break
+            self.more()
+        self.start = self.pos
+        self.pos = end
+        return self.offset+self.start, self.offset+end
+
+    def value(self) -> Any:
+        # decode the value skipped last.
+        return loads_json(self.buf[self.start:self.pos], self.encoding)
+
+    def read(self) -> Any:
+        # decode the next value.
+        self.skip()
+        return self.value()
+
+    def seek_key(self, key: str) -> bool:
+        # move to the value of the top-level key.
+        self.expect(b'{')
+        if self.peek() == b'}':
+            return False
+        while True:
+            name = self.read()
+            self.expect(b':')
+            if name == key:
+                return True
+            self.skip()
+            if self.expect(b',}') == b'}':
+                return False
+
+    def shallow(self, keys: tuple[str, ...]) -> dict[str, Any]:
+        # decode only the values of the specified keys in the next object.
+        res = {}
+        self.expect(b'{')
+        if self.peek() == b'}':
+            self.pos += 1
+            return res
+        while True:
+            name = self.read()
+            self.expect(b':')
+            if name in keys:
+                res[name] = self.read()
+            else:
+                self.skip()
+            if self.expect(b',}') == b'}':
+                return res
+
+    def items(self) -> Iterator[tuple[int, int]]:
+        # skip the items in the array one by one and
+        # yield the file positions of each item.
+        # the item can be decoded by value() after yielded.
+        self.expect(b'[')
+        if self.peek() == b']':
+            return
+        while True:
+            yield self.skip()
+            if self.expect(b',]') == b']':
+                return
+
+
+class CellPos(NamedTuple):
+    # position of a cell in the file and the values for the selection.
+    start: int
+    end: int
+    cell_type: str
+    exec_count: None | int
+
+
+class NotebookStream():
+    """
+    Read the cells of a Jupyter notebook one by one without
+    loading the whole file.
+    """
+    def __init__(self, fpath: Path, encoding: str,
+                 bufsize: int = 1 << 20):
+        self.fpath = fpath
+        self.encoding = encoding
+        self.bufsize = bufsize
+        self.data: None | dict[str, Any] = None
+        self.offsets: None | list[CellPos] = None
+        if codecs.lookup(encoding).name not in _stream_encodings:
+            # multi-byte characters may include "[", "{", etc.
+            logger.info(f'load the whole notebook for {encoding}.')
+            self.data = load_json(fpath, encoding)
+
+    def _reader(self, f: BinaryIO) -> _JSONReader:
+        return _JSONReader(f, self.encoding, self.bufsize)
+
+    def _tail_metadata(self) -> None | dict[str, Any]:
+        # the top-level "metadata" usually follows "cells".
+        # find it from the end of the file.
+        size = self.fpath.stat().st_size
+        decoder = json.JSONDecoder()
+        with open(self.fpath, 'rb') as f:
+            for tail in [1 << 16, 1 << 20]:
+                f.seek(max(0, size-tail))
+                text = f.read().decode(self.encoding, errors='ignore')
+                idx = len(text)
+                while True:
+                    idx = text.rfind('"metadata"', 0, idx)
+                    if idx < 0:
+                        break
+                    colon = _colon_re.match(text, idx+len('"metadata"'))
+                    if colon is None:
+                        # "metadata" is a value, not a key.
+                        continue
+                    st = colon.end()
+                    try:
+                        meta, end = decoder.raw_decode(text, st)
+                    except ValueError:
+                        continue
+                    if len(text)-end > _tail_rest_max:
+                        # the earlier candidates are also followed by
+                        # long texts, e.g., cells after the metadata.
+                        return None
+                    if type(meta) is not dict:
+                        continue
+                    rest = text[end:].strip()
+                    if rest == '}':
+                        return meta
+                    # rest should be the rest of the top-level dict.
+                    if not rest.startswith(','):
+                        continue
+                    try:
+                        top = json.loads('{'+rest[1:])
+                    except ValueError:
+                        continue
+                    if type(top) is dict:
+                        return meta
+                if tail >= size:
+                    break
+        return None
+
+    def metadata(self) -> dict[str, Any]:
+        if self.data is not None:
+            return self.data['metadata']
+        meta = self._tail_metadata()
+        if meta is not None:
+            return meta
+        logger.info('metadata is not found at the end of file.')
+        with open(self.fpath, 'rb') as f:
+            reader = self._reader(f)
+            if reader.seek_key('metadata'):
+                return reader.read()
+        return {}
+
+    def index(self) -> list[CellPos]:
+        # file positions, types, and execution counts of the cells.
+        # only the top-level keys of cells are scanned, and
+        # other values (source, outputs, etc.) are not decoded.
+        if self.offsets is not None:
+            return self.offsets
+        offsets = []
+        keys = ('cell_type', 'execution_count')
+        if self.data is not None:
+            # positions are not used in this case.
+            offsets = [CellPos(-1, -1, cell.get(keys[0], '???'),
+                               cell.get(keys[1]))
+                       for cell in self.data['cells']]
+        else:
+            with open(self.fpath, 'rb') as f:
+                reader = self._reader(f)
+                if reader.seek_key('cells'):
+                    offsets = list(self._scan(reader, keys))
+        self.offsets = offsets
+        return offsets
+
+    def _scan(self, reader: _JSONReader,
+              keys: tuple[str, ...]) -> Iterator[CellPos]:
+        reader.expect(b'[')
+        if reader.peek() == b']':
+            return
+        while True:
+            reader.peek()
+            start = reader.offset+reader.pos
+            info = reader.shallow(keys)
+            yield CellPos(start, reader.offset+reader.pos,
+                          info.get(keys[0], '???'), info.get(keys[1]))
+            if reader.expect(b',]') == b']':
+                return
+
+    def count(self) -> int:
+        return len(self.index())
+
+    def cell(self, idx: int) -> dict[str, Any]:
+        # decode only the specified cell.
+        if self.data is not None:
+            return self.data['cells'][idx]
+        pos = self.index()[idx]
+        with open(self.fpath, 'rb') as f:
+            f.seek(pos.start)
+            text = f.read(pos.end-pos.start)
+        return loads_json(text, self.encoding)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for _, cell in self.sized_cells():
+            yield cell
+
+    def sized_cells(self) -> Iterator[tuple[int, dict[str, Any]]]:
+        # yield the cells with their sizes in the file.
+        if self.data is not None:
+            for cell in self.data['cells']:
+                size = len(json.dumps(cell, ensure_ascii=False).encode(
+                    self.encoding, errors='replace'))
+                yield size, cell
+            return
+        with open(self.fpath, 'rb') as f:
+            reader = self._reader(f)
+            if not reader.seek_key('cells'):
+                return
+            for start, end in reader.items():
+                yield end-start, reader.value()
+
+
+class ImageOutputs():
+    """
+    Keep the positions of image outputs in the notebook.
+    The image data is read again and decoded only when it is shown.
+    The same images are registered only once.
+    """
+    def __init__(self, notebook: NotebookStream):
+        self.notebook = notebook
+        # mime type, index of the cell, index of the output
+        self.images: list[tuple[str, int, int]] = []
+        self.ids: dict[str, int] = {}  # hash -> index of images
+
+    def add(self, mime: str, code: str | list[str],
+            cell_idx: int, out_idx: int) -> int:
+        if isinstance(code, list):
+            code = ''.join(code)
+        key = hashlib.sha256(code.encode()).hexdigest()
+        if key not in self.ids:
+            self.ids[key] = len(self.images)
+            self.images.append((mime, cell_idx, out_idx))
+        return self.ids[key]+1
+
+    def read(self, img_id: int) -> str:
+        # base64 code of the image.
+        mime, cell_idx, out_idx = self.images[img_id-1]
+        code = self.notebook.cell(cell_idx)['outputs'][out_idx]['data'][mime]
+        if isinstance(code, list):
+            code = ''.join(code)
+        return code
+
+    def show(self, img_id: int, args: Args) -> None:
+        if not 1 <= img_id <= len(self.images):
+            print_error(f'image {img_id} is not found.')
+            return
+        mime = self.images[img_id-1][0]
+        try:
+            code = self.read(img_id)
+        except (OSError, ValueError, LookupError) as e:
+            logger.error(f'failed to read image {img_id}: {e}')
+            print_error(f'failed to read image {img_id}.')
+            return
+        img_bin = base64.b64decode(code)
+        ext = mime.split('/')[-1]
+        ret = show_image_bytes(img_bin, f'out-{img_id}.{ext}', args,
+                               wait=False)
+        if ret is None:
+            print_error('image viewer is not found.')
+        elif not ret:
+            print_error('failed to open an image.')
+
+
+def get_limits(full_output: bool) -> None | tuple[int, int]:
+    # max number of lines and bytes of one output.
+    if full_output:
+        return None
+    return get_config('output_max_lines'), get_config('output_max_bytes')
+
+
+def _cut_line(text: str, size: int, head: bool) -> str:
+    # cut a line to the specified size in bytes.
+    data = text.encode('utf-8')
+    if head:
+        return data[:size].decode('utf-8', errors='ignore')
     else:
-        header = '# '
+        return data[len(data)-size:].decode('utf-8', errors='ignore')
+
+
+def truncate_output(texts: str | list[str],
+                    limits: None | tuple[int, int]) -> list[str]:
+    """
+    Keep the head and tail of a long output.
+    """
+    if isinstance(texts, str):
+        texts = texts.splitlines(keepends=True)
+    if limits is None:
+        return texts
+    num = len(texts)
+    max_lines, max_bytes = limits
+    if max_lines <= 0:
+        max_lines = num
+    if max_bytes <= 0:
+        max_bytes = -1
+    if num <= max_lines and \
+       (max_bytes < 0 or sum(len(t) for t in texts)*4 <= max_bytes or
+            sum(len(t.encode('utf-8')) for t in texts) <= max_bytes):
+        return texts
+
+    def pick(lines: Iterator[str], nline: int, nbyte: int,
+             is_head: bool) -> list[str]:
+        res = []
+        for t in lines:
+            if len(res) >= nline:
+                break
+            size = len(t.encode('utf-8'))
+            if max_bytes >= 0 and size > nbyte:
+                if len(res) == 0 and nbyte > 0:
+                    # cut the line only if it is too long by itself.
+                    # the marker should be written in its own line.
+                    cut = _cut_line(t, nbyte, is_head)
+                    if not cut.endswith('\n'):
+                        cut += '\n'
+                    res.append(cut)
+                break
+            res.append(t)
+            nbyte -= size
+        return res
+
+    head = pick(iter(texts), max_lines-max_lines//2,
+                max_bytes-max_bytes//2, True)
+    nhead = len(head)
+    if nhead != 0 and head[-1] != texts[nhead-1]:
+        # the tail of this line can be shown.
+        nhead -= 1
+    tail = pick(reversed(texts[nhead:]), max_lines//2,
+                max_bytes//2, False)
+    tail.reverse()
+    omit = num-nhead-len(tail)
+    marker = f'... {omit} lines are omitted' if omit > 0 \
+        else '... output is truncated'
+    marker += ' (use --full_output to show all) ...\n'
+    return head+[marker]+tail
+
+
+def show_output(output: dict[str, Any], header: str, out_obj,
+                images: None | ImageOutputs,
+                limits: None | tuple[int, int],
+                cell_idx: int, out_idx: int) -> list[int]:
+    # images are not shown if images is None.
+    # return the list of the image numbers in this output.
+    img_ids = []
     if 'text' in output:
-        for text in output['text']:
+        for text in truncate_output(output['text'], limits):
             print(f'{header}{text}', end='', file=out_obj)
         print(file=out_obj)
     if 'data' in output:
         out_data = output['data']
         for out_type in out_data:
             if out_type == 'text/plain':
-                for text in out_data['text/plain']:
+                for text in truncate_output(out_data['text/plain'], limits):
                     print(f'{header}{text}', end='', file=out_obj)
                 print(file=out_obj)
-            elif out_type == 'image/png':
-                if out_obj != sys.stdout:
+            elif out_type in ['image/png', 'image/jpeg']:
+                if images is None:
                     # --output case
                     continue
-                img_code = out_data['image/png']
-                img_bin = base64.b64decode(img_code.encode())
-                tmpfile = f'{tmpdir.name}/out-{cnt}.png'
-                add_idx = 0
-                while Path(tmpfile).is_file():
-                    tmpfile = f'{tmpdir.name}/out-{cnt}_{add_idx}.png'
-                    add_idx += 1
-                with open(tmpfile, 'wb') as tmp:
-                    tmp.write(img_bin)
-                    ret = show_image_file(tmpfile, args, wait=False)
-                if ret is None:
-                    print_error('image viewer is not found.')
-                elif not ret:
-                    print_error('failed to open an image.')
-
-
-def syntax_text(text: str, out_obj, lexer: Lexer | None,
+                img_id = images.add(out_type, out_data[out_type],
+                                    cell_idx, out_idx)
+                img_ids.append(img_id)
+                print(f'[image {img_id}: {out_type}]', file=out_obj)
+    return img_ids
+
+
+def ask_images(msg: str, images: ImageOutputs, args: Args) -> str:
+    # show images while the image number is entered.
+    while True:
+        key = input(msg)
+        if key.isdecimal():
+            images.show(int(key), args)
+        else:
+            return key
+
+
+class _HighlightCache():
+    # highlighted texts saved in files named by the hash of the key.
+    # the least recently used files are removed if the total size
+    # exceeds max_bytes (no limit if 0 or less).
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        # bytes written after the last pruning; None if not pruned yet.
+        self.written: None | int = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> None | str:
+        cache_file = self.root/key[:2]/key
+        try:
+            res = cache_file.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, UnicodeError) as e:
+            logger.warning(f'failed to read cache {cache_file}: {e}')
+            self.misses += 1
+            return None
+        try:
+            # the modified time is used as the last access time.
+            os.utime(cache_file)
+        except OSError:
+            pass
+        self.hits += 1
+        return res
+
+    def put(self, key: str, text: str) -> None:
+        cache_file = self.root/key[:2]/key
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(f'.{os.getpid()}')
+            tmp_file.write_text(text, encoding='utf-8')
+            tmp_file.replace(cache_file)
+        except (OSError, UnicodeError) as e:
+            logger.warning(f'failed to write cache {cache_file}: {e}')
+            return
+        if self.max_bytes <= 0:
+            return
+        # pruning lists all files, so it runs at the first write and
+        # then only after max_bytes/4 bytes are written.
+        if self.written is not None:
+            self.written += len(text)
+            if self.written < self.max_bytes//4:
+                return
+        self.prune()
+
+    def prune(self) -> None:
+        files = []
+        for cache_file in self.root.glob('*/*'):
+            try:
+                stat = cache_file.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, cache_file))
+        total = sum(size for _, size, _ in files)
+        files.sort()
+        for _, size, cache_file in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                cache_file.unlink()
+            except OSError:
+                # may be removed by other processes.
+                pass
+            total -= size
+        self.written = 0
+        logger.debug(f'highlight cache: {total} bytes')
+
+
+_highlight_cache: None | _HighlightCache = None
+
+
+def cached_highlight(text: str, lexer: Lexer,
+                     fmter: TerminalFormatter | Terminal256Formatter) -> str:
+    global _highlight_cache
+    if not get_config('highlight_cache'):
+        return highlight(text, lexer, fmter)
+    if _highlight_cache is None:
+        _highlight_cache = _HighlightCache(
+            GLOBAL_CONF.conf_dir/'.cache/jupyter',
+            get_config('highlight_cache_size') << 20)
+    style = getattr(fmter.style, '__name__', '')
+    options = sorted(lexer.options.items())
+    key = '\0'.join([pygments_version, lexer.name, str(options),
+                     type(fmter).__name__, style, text])
+    key = hashlib.sha256(key.encode('utf-8', 'surrogatepass')).hexdigest()
+    res = _highlight_cache.get(key)
+    if res is None:
+        res = highlight(text, lexer, fmter)
+        _highlight_cache.put(key, res)
+    return res
+
+
+def syntax_text(text: str, lexer: Lexer | None,
                 fmter: TerminalFormatter | Terminal256Formatter | None
                 ) -> str:
     if not use_pygments:
@@ -76,77 +630,312 @@ def syntax_text(text: str, out_obj, lexer: Lexer | None,
         return text
     elif text.startswith('!') or text.startswith('%'):
         return text
-    elif out_obj != sys.stdout:
-        return text
     else:
-        return highlight(text, lexer, fmter)
+        return cached_highlight(text, lexer, fmter)
 
 
-def add_args(parser):
-    add_args_imageviewer(parser)
-    add_args_verbose(parser, help='Show all cells at once.')
-    add_args_output(parser, help='Output the information to'
-                    ' the specified file as a Python script.')
-    add_args_encoding(parser)
-    parser.add_argument('--language', '-l',
-                        help='Specify the language for syntax highlight.',
-                        default=None)
+def syntax_cell(source: str | list[str], header: str,
+                lexer: Lexer | None,
+                fmter: TerminalFormatter | Terminal256Formatter | None
+                ) -> str:
+    # highlight the source of a cell at once except for
+    # shell commands (!) and magic commands (%).
+    if isinstance(source, str):
+        source = source.splitlines(keepends=True)
+    res = []
+    code: list[str] = []
+    for instr in source:
+        if instr.startswith('!') or instr.startswith('%'):
+            if len(code) != 0:
+                res.append(syntax_text(''.join(code), lexer, fmter))
+                code = []
+            res.append(f'{header}{instr}')
+        else:
+            code.append(instr)
+    if len(code) != 0:
+        res.append(syntax_text(''.join(code), lexer, fmter))
+    return ''.join(res)
 
 
-def show_help():
-    helpmsg = help_template('jupyter', 'show the saved jupyter notebook.',
-                            add_args)
-    print(helpmsg)
+def _human_size(size: float) -> str:
+    if size < 1024:
+        return f'{int(size)} B'
+    for unit in ['KB', 'MB', 'GB']:
+        size /= 1024
+        if size < 1024:
+            break
+    return f'{size:.1f} {unit}'
 
 
-def main(fpath: Path, args: Args) -> int:
-    if args_chk(args, 'encoding'):
-        enc = args.encoding
-    else:
-        enc = get_config('encoding')
+def _is_binary_mime(mime: str) -> bool:
+    # non-text data are saved as base64 strings in notebooks.
+    return not (mime.startswith('text/') or mime.endswith('json') or
+                mime.endswith('+xml') or mime == 'application/javascript')
 
-    with open(fpath, 'r', encoding=enc) as f:
-        data = json.load(f)
-    logger.debug(f'keys: {data.keys()}')
-    if args_chk(args, 'output'):
-        outp = Path(args.output)
-        if outp.is_dir():
-            print_error(f'{args.output} is a directory. please specify a file.')
-            return 2
-        if not outp.parent.is_dir():
-            outp.parent.mkdir(parents=True)
-        with open(outp, 'w') as f:
-            f.write('#! /usr/bin/env python3\n')
-        outf = open(outp, 'a')
-        header = '# '
-        fgi, bgi = (None, None)
-        fgo, bgo = (None, None)
-        fgt, bgt = (None, None)
-    else:
-        outf = sys.stdout
-        header = ''
-        fgi, bgi = get_col('input_color')
-        fgo, bgo = get_col('output_color')
-        fgt, bgt = get_col('type_color')
 
-    tmpdir = tempfile.TemporaryDirectory()
-    logger.info(f'tmpdir: {tmpdir.name}')
+def _b64_size(code: str) -> int:
+    # size of the decoded data without decoding.
+    code = ''.join(code.split())
+    return len(code)*3//4-len(code)+len(code.rstrip('='))
 
-    meta = data['metadata']
-    logger.debug(f'meta data: {meta}')
-    if args_chk(args, 'verbose'):
+
+def _text_size(text: str | list[str]) -> int:
+    if isinstance(text, list):
+        text = ''.join(text)
+    return len(text.encode('utf-8'))
+
+
+class CellSize():
+    """
+    Sizes of the source and outputs of a cell.
+    """
+    def __init__(self, idx: int, cell: dict[str, Any], size: int):
+        self.idx = idx
+        self.cell_type = cell.get('cell_type', '???')
+        self.exec_count = cell.get('execution_count')
+        self.size = size  # size in the file.
+        self.sizes: dict[str, int] = {}  # category -> size in the file
+        self.decoded: dict[str, int] = {}  # mime type -> decoded size
+        self.add('source', _text_size(cell.get('source', '')))
+        # attachments are {file name: {mime type: data}}.
+        for bundle in cell.get('attachments', {}).values():
+            if not isinstance(bundle, dict):
+                continue
+            for mime, code in bundle.items():
+                self.add_data(mime, code)
+        for output in cell.get('outputs', []):
+            for key in ['text', 'traceback']:
+                if key in output:
+                    self.add('text', _text_size(output[key]))
+            for mime, code in output.get('data', {}).items():
+                self.add_data(mime, code)
+
+    def add(self, category: str, size: int, decoded: int = -1) -> None:
+        self.sizes[category] = self.sizes.get(category, 0)+size
+        if decoded >= 0:
+            self.decoded[category] = self.decoded.get(category, 0)+decoded
+
+    def add_data(self, mime: str, code: Any) -> None:
+        if isinstance(code, (dict, list)) and mime.endswith('json'):
+            code = json.dumps(code)
+        if not isinstance(code, (str, list)):
+            return
+        if _is_binary_mime(mime):
+            if isinstance(code, list):
+                code = ''.join(code)
+            self.add(mime, len(code), _b64_size(code))
+        else:
+            self.add('text', _text_size(code))
+
+    def label(self) -> str:
+        if self.cell_type == 'code':
+            cnt = ' ' if self.exec_count is None else self.exec_count
+            return f'cell {self.idx+1} (In [{cnt}])'
+        return f'cell {self.idx+1} ({self.cell_type})'
+
+    def details(self) -> str:
+        res = []
+        for cat, size in sorted(self.sizes.items(), key=lambda x: -x[1]):
+            if size == 0:
+                continue
+            if cat in self.decoded:
+                res.append(f'{cat}: {_human_size(size)}'
+                           f' ({_human_size(self.decoded[cat])} decoded)')
+            else:
+                res.append(f'{cat}: {_human_size(size)}')
+        return ', '.join(res)
+
+
+def size_report(notebook: NotebookStream, top: int) -> None:
+    """
+    Show which cells and outputs make the notebook big.
+    """
+    totals = CellSize(-1, {}, 0)
+    largest: list[tuple[int, int, CellSize]] = []
+    num = 0
+    for i, (size, cell) in enumerate(notebook.sized_cells()):
+        cell_size = CellSize(i, cell, size)
+        num += 1
+        totals.size += size
+        for cat, csize in cell_size.sizes.items():
+            totals.add(cat, csize, cell_size.decoded.get(cat, -1))
+        # keep only the top cells.
+        heapq.heappush(largest, (size, -i, cell_size))
+        if len(largest) > top:
+            heapq.heappop(largest)
+
+    file_size = notebook.fpath.stat().st_size
+    print_key('total')
+    print(f'file size: {_human_size(file_size)}, {num} cells'
+          f' ({_human_size(totals.size)})')
+    for cat, size in sorted(totals.sizes.items(), key=lambda x: -x[1]):
+        line = f'  {cat:<24} {_human_size(size):>10}'
+        if cat in totals.decoded:
+            line += f'  ({_human_size(totals.decoded[cat])} decoded)'
+        print(line)
+    if top <= 0 or num == 0:
+        return
+    print_key(f'top {min(top, num)} cells')
+    for size, _, cell_size in sorted(largest, reverse=True):
+        print(f'  {cell_size.label():<24} {_human_size(size):>10}'
+              f'  {cell_size.details()}')
+
+
+class CellWriter():
+    """
+    Write cells to the file object.
+    """
+    def __init__(self, outf, header: str,
+                 lexer: Lexer | None,
+                 fmter: TerminalFormatter | Terminal256Formatter | None,
+                 images: None | ImageOutputs, num_cells: None | int,
+                 colored: bool, limits: None | tuple[int, int]):
+        self.outf = outf
+        self.limits = limits
+        self.header = header
+        self.lexer = lexer
+        self.fmter = fmter
+        self.images = images
+        self.num_cells = num_cells
+        if colored:
+            self.fgi, self.bgi = get_col('input_color')
+            self.fgo, self.bgo = get_col('output_color')
+            self.fgt, self.bgt = get_col('type_color')
+        else:
+            self.fgi, self.bgi = (None, None)
+            self.fgo, self.bgo = (None, None)
+            self.fgt, self.bgt = (None, None)
+
+    def write_meta(self, meta: dict[str, Any]) -> None:
+        header = self.header
         if 'kernelspec' in meta:
             ker = meta['kernelspec'].get('display_name', '???')
-            print(f'{header}kernel   : {ker}', file=outf)
+            print(f'{header}kernel   : {ker}', file=self.outf)
         if 'language_info' in meta:
             lname = meta['language_info'].get('name', '???')
             lver = meta['language_info'].get('version', '???')
-            print(f'{header}language : {lname} {lver}', file=outf)
+            print(f'{header}language : {lname} {lver}', file=self.outf)
         if 'colab' in meta:
             coname = meta['colab'].get('name', '???')
-            print(f'{header}colab : {coname}', file=outf)
+            print(f'{header}colab : {coname}', file=self.outf)
+
+    def write(self, i: int, cell: dict[str, Any]) -> list[int]:
+        # return the list of the image numbers in this cell.
+        img_ids = []
+        header = self.header
+        outf = self.outf
+        logger.debug(f'\n---- cell ----\n{cell}\n---------------')
+        if self.num_cells is not None:
+            num = f' ({i+1}/{self.num_cells})'
+        else:
+            num = ''
+        if cell['cell_type'] == 'code':
+            cnt = cell['execution_count']
+            if cnt is None:
+                cnt = ' '
+            # Input
+            cprint(f'{header}In [{cnt}]{num}',
+                   fg=self.fgi, bg=self.bgi, file=outf)
+            print(syntax_cell(cell['source'], header,
+                              self.lexer, self.fmter),
+                  end='', file=outf)
+            print(file=outf)
+            # Output
+            if len(cell['outputs']) != 0:
+                cprint(f'{header}Out [{cnt}]{num}',
+                       fg=self.fgo, bg=self.bgo, file=outf)
+            for j, output in enumerate(cell['outputs']):
+                img_ids += show_output(output, header, outf, self.images,
+                                       self.limits, i, j)
+        elif cell['cell_type'] == 'markdown':
+            cprint(f'{header}markdown{num}',
+                   fg=self.fgt, bg=self.bgt, file=outf)
+            for instr in cell['source']:
+                print(f'{header}{instr}', end='', file=outf)
+            print(file=outf)
+        elif cell['cell_type'] == 'raw':
+            cprint(f'{header}raw{num}',
+                   fg=self.fgt, bg=self.bgt, file=outf)
+            for instr in cell['source']:
+                print(f'{header}{instr}', end='', file=outf)
+            print(file=outf)
+
+        else:
+            logger.error(f'not a supported type of cell: {cell["cell_type"]}')
+        return img_ids
+
+
+def get_cell_names(num_cells: int) -> list[str]:
+    # zero-padded to keep the order in the sidebar.
+    width = len(str(num_cells))
+    return [f'cell{i+1:0{width}d}' for i in range(num_cells)]
+
+
+def get_contents(names: list[str], path: PurePath) -> tuple[list[str],
+                                                            list[str]]:
+    if str(path) == '.':
+        return [], names
+    return [], []
+
+
+def show_cell(notebook: NotebookStream, names: dict[str, int],
+              lexer: Lexer | None, images: ImageOutputs,
+              limits: None | tuple[int, int], args: LocalArgs,
+              cpath: str, **kwargs) -> RM:
+    # render the cell only when it is selected.
+    if cpath not in names:
+        return RM(f'{cpath} is not found.', True)
+    idx = names[cpath]
+    try:
+        cell = notebook.cell(idx)
+    except (OSError, ValueError) as e:
+        logger.error(f'failed to read {cpath}: {e}')
+        return RM(f'Error!! Cannot read {cpath}.', True)
+    if get_config('show_number'):
+        num_cells = notebook.count()
+    else:
+        num_cells = None
+    out = io.StringIO()
+    # escape sequences are not available in the curses window.
+    writer = CellWriter(out, '', lexer, None, images, num_cells, False,
+                        limits)
+    img_ids = writer.write(idx, cell)
+    if 'system' in kwargs and kwargs['system']:
+        for img_id in img_ids:
+            images.show(img_id, args)
+    elif len(img_ids) != 0:
+        print('NOTE: open this cell with the system command'
+              ' to show the images.', file=out)
+    return RM(out.getvalue().rstrip('\n'), False)
+
+
+def select_cells(index: list[CellPos], cell_specs: None | list[str],
+                 exec_counts: None | list[int]) -> list[int]:
+    # return the indices of the cells specified by --cell and --exec_count.
+    num = len(index)
+    res: set[int] = set()
+    for spec in cell_specs or []:
+        st, sep, end = spec.partition(':')
+        try:
+            start = int(st) if st else 1
+            if sep:
+                stop = min(int(end), num) if end else num
+            else:
+                stop = start
+        except ValueError:
+            raise ValueError(f'invalid cell number: {spec}')
+        if not 1 <= start <= stop or start > num:
+            raise ValueError(f'cell {spec} is out of range (1-{num}).')
+        res.update(range(start-1, stop))
+    for cnt in exec_counts or []:
+        found = [i for i, pos in enumerate(index) if pos.exec_count == cnt]
+        if len(found) == 0:
+            raise ValueError(f'execution count {cnt} is not found.')
+        res.update(found)
+    return sorted(res)
+
 
-    # set formatter
+def get_formatter() -> TerminalFormatter | Terminal256Formatter | None:
     hi_text = get_config('syntax_highlight')
     fmt_style = get_config('highlight_style')
     if not hi_text or not use_pygments:
@@ -156,10 +945,12 @@ def main(fpath: Path, args: Args) -> int:
     else:
         fmter = TerminalFormatter(style=fmt_style)
     logger.debug(f'formatter: {fmter} / {fmt_style}')
+    return fmter
 
-    # set language and Lexer
-    if args.language is not None:
-        lang = args.language
+
+def get_lexer(language: None | str, meta: dict[str, Any]) -> Lexer | None:
+    if language is not None:
+        lang = language
     else:
         lang = get_config('language')
     if lang == "":
@@ -171,68 +962,240 @@ def main(fpath: Path, args: Args) -> int:
         lexer = None
     else:
         try:
-            lexer = get_lexer_by_name(lang)
+            # keep the blank lines and the end of the source as they are.
+            lexer = get_lexer_by_name(lang, stripnl=False, ensurenl=False)
         except ClassNotFound:
             logger.warning(f'lexer for {lang} not found.')
             lexer = None
     logger.debug(f'lexer: {lexer}')
+    return lexer
+
+
+# configuration shared in the worker processes of the batch conversion.
+_batch_conf: dict[str, Any] = {}
+
+
+def _init_worker(encoding: str, show_num: bool,
+                 limits: None | tuple[int, int]) -> None:
+    # called once in each worker process.
+    _batch_conf['encoding'] = encoding
+    _batch_conf['show_number'] = show_num
+    _batch_conf['limits'] = limits
+
 
-    L = len(data['cells'])
+def write_script(src: Path, dst: Path, encoding: str,
+                 show_num: bool, limits: None | tuple[int, int]) -> None:
+    # convert a notebook to a python script.
+    # highlight is not used in the script; lexer and formatter are None.
+    notebook = NotebookStream(src, encoding)
+    num_cells = notebook.count() if show_num else None
+    try:
+        with open(dst, 'w') as outf:
+            outf.write('#! /usr/bin/env python3\n')
+            writer = CellWriter(outf, '# ', None, None, None,
+                                num_cells, False, limits)
+            for i, cell in enumerate(notebook):
+                writer.write(i, cell)
+    except Exception:
+        # do not leave the incomplete script.
+        dst.unlink(missing_ok=True)
+        raise
+
+
+def _convert(src: Path, dst: Path) -> Path:
+    write_script(src, dst, _batch_conf['encoding'],
+                 _batch_conf['show_number'], _batch_conf['limits'])
+    return src
+
+
+def _output_names(files: list[Path], outdir: Path) -> dict[Path, Path]:
+    # set output file names; notebooks of the same name are
+    # saved as name.py, name_1.py, name_2.py, ...
+    dsts: dict[Path, Path] = {}
+    used: set[Path] = set()
+    # stem -> next index to try
+    next_idx: dict[str, int] = {}
+    for src in files:
+        src = src.expanduser().resolve()
+        if src in dsts:
+            continue
+        dst = outdir/f'{src.stem}.py'
+        idx = next_idx.get(src.stem, 1)
+        while dst in used:
+            dst = outdir/f'{src.stem}_{idx}.py'
+            idx += 1
+        next_idx[src.stem] = idx
+        used.add(dst)
+        dsts[src] = dst
+    return dsts
+
+
+def batch_convert(files: list[Path], outdir: Path, encoding: str,
+                  jobs: None | int,
+                  limits: None | tuple[int, int] = None) -> int:
+    if outdir.exists() and not outdir.is_dir():
+        print_error(f'{outdir} is not a directory.')
+        return 2
+    outdir.mkdir(parents=True, exist_ok=True)
+    dsts = _output_names(files, outdir)
     show_num = get_config('show_number')
-    for i, cell in enumerate(data['cells']):
-        logger.debug(f'\n---- cell ----\n{cell}\n---------------')
-        if show_num:
-            num = f' ({i+1}/{L})'
-        else:
-            num = ''
-        if cell['cell_type'] == 'code':
-            cnt = cell['execution_count']
-            if cnt is None:
-                cnt = ' '
-            # Input
-            cprint(f'{header}In [{cnt}]{num}',
-                   fg=fgi, bg=bgi, file=outf)
-            for instr in cell['source']:
-                if instr.startswith('!'):
-                    # shell command
-                    outtext = f'{header}{instr}'
-                elif instr.startswith('%'):
-                    # magic command
-                    outtext = f'{header}{instr}'
-                else:
-                    outtext = syntax_text(instr, outf, lexer, fmter)
-                print(outtext, end='', file=outf)
-            print(file=outf)
-            # Output
-            if len(cell['outputs']) != 0:
-                cprint(f'{header}Out [{cnt}]{num}',
-                       fg=fgo, bg=bgo, file=outf)
-            for output in cell['outputs']:
-                show_output(output, args, cnt, outf, tmpdir)
-        elif cell['cell_type'] == 'markdown':
-            cprint(f'{header}markdown{num}',
-                   fg=fgt, bg=bgt, file=outf)
-            for instr in cell['source']:
-                print(f'{header}{instr}', end='', file=outf)
-            print(file=outf)
-        elif cell['cell_type'] == 'raw':
-            cprint(f'{header}raw{num}',
-                   fg=fgt, bg=bgt, file=outf)
-            for instr in cell['source']:
-                print(f'{header}{instr}', end='', file=outf)
-            print(file=outf)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(encoding, show_num, limits)) as executor:
+        futures = {executor.submit(_convert, src, dst): src
+                   for src, dst in dsts.items()}
+        for future in as_completed(futures):
+            src = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f'failed to convert {src}: {e}')
+                print_error(f'{src}: {type(e).__name__}: {e}')
+            else:
+                print(f'{src} -> {dsts[src]}')
+    if failed != 0:
+        print_error(f'{failed}/{len(dsts)} notebooks are not converted.')
+        return 1
+    return 0
 
-        else:
-            logger.error(f'not a supported type of cell: {cell["cell_type"]}')
 
-        if not (args_chk(args, 'verbose') or args_chk(args, 'output')):
-            key = input(' >>> Press ENTER to continue or "quit" to break: ')
+def add_args(parser):
+    add_args_imageviewer(parser)
+    add_args_specification(parser, verbose=True, key=False,
+                           interactive=False, cui=True,
+                           kwargs_v=dict(help='Show all cells at once.'))
+    add_args_output(parser, help='Output the information to'
+                    ' the specified file as a Python script.'
+                    ' With --batch, specify the output directory.')
+    add_args_encoding(parser)
+    parser.add_argument('--language', '-l',
+                        help='Specify the language for syntax highlight.',
+                        default=None)
+    parser.add_argument('--batch', nargs='+', metavar='NOTEBOOK',
+                        help='Convert the file and the specified notebooks'
+                        ' to Python scripts in the --output directory'
+                        ' in parallel.',
+                        default=None)
+    parser.add_argument('--jobs', '-j', type=int,
+                        help='Number of processes used with --batch.'
+                        ' Default is the number of CPUs.',
+                        default=None)
+    parser.add_argument('--cell', nargs='+', metavar='N[:M]',
+                        help='Show only the specified cells.'
+                        ' "N:M" shows the cells from N to M.'
+                        ' The first cell is 1.',
+                        default=None)
+    parser.add_argument('--exec_count', nargs='+', type=int, metavar='K',
+                        help='Show only the cells whose execution count'
+                        ' is K.',
+                        default=None)
+    parser.add_argument('--size_report', '-S', type=int, nargs='?',
+                        const=10, metavar='TOP',
+                        help='Show the sizes of the sources and outputs'
+                        ' and the TOP largest cells (default: 10).',
+                        default=None)
+    parser.add_argument('--full_output', '-F', action='store_true',
+                        help='Show all lines of long outputs.'
+                        ' By default, only the head and tail of outputs'
+                        ' longer than the "output_max_lines" or'
+                        ' "output_max_bytes" option are shown.')
+
+
+def show_help():
+    helpmsg = help_template('jupyter', 'show the saved jupyter notebook.',
+                            add_args)
+    print(helpmsg)
+
+
+def get_num_cells(notebook: NotebookStream) -> None | int:
+    # the number of cells is shown only if show_number is set.
+    if get_config('show_number'):
+        return notebook.count()
+    return None
+
+
+def write_cells(notebook: NotebookStream, writer: CellWriter,
+                meta: dict[str, Any], args: LocalArgs) -> int:
+    # write the selected cells (all cells if not selected).
+    images = writer.images
+    if args.cell is not None or args.exec_count is not None:
+        try:
+            selected = select_cells(notebook.index(), args.cell,
+                                    args.exec_count)
+        except ValueError as e:
+            print_error(str(e))
+            return 1
+        cells: Iterator[tuple[int, dict[str, Any]]] = \
+            ((i, notebook.cell(i)) for i in selected)
+    else:
+        cells = enumerate(notebook)
+    if args_chk(args, 'verbose'):
+        writer.write_meta(meta)
+
+    for i, cell in cells:
+        writer.write(i, cell)
+        if images is not None and not args_chk(args, 'verbose'):
+            key = ask_images(' >>> Press ENTER to continue,'
+                             ' image number to show,'
+                             ' or "quit" to break: ', images, args)
             if key == 'quit':
                 break
 
-    if args_chk(args, 'verbose'):
-        input('Press ENTER to close file.')
-    outf.close()
-    tmpdir.cleanup()
-    logger.info('cleanup tmpdir.')
+    if images is not None and args_chk(args, 'verbose'):
+        ask_images('Enter image number to show or'
+                   ' press ENTER to close file: ', images, args)
     return 0
+
+
+def main(fpath: Path, args: LocalArgs) -> int:
+    if args_chk(args, 'encoding'):
+        enc = args.encoding
+    else:
+        enc = get_config('encoding')
+
+    if args.batch is not None:
+        if not args_chk(args, 'output'):
+            print_error('--batch requires --output to set the directory.')
+            return 2
+        return batch_convert([fpath]+[Path(f) for f in args.batch],
+                             Path(args.output), enc, args.jobs,
+                             get_limits(args.full_output))
+
+    notebook = NotebookStream(fpath, enc)
+    if args.size_report is not None:
+        size_report(notebook, args.size_report)
+        return 0
+
+    meta = notebook.metadata()
+    logger.debug(f'meta data: {meta}')
+    lexer = get_lexer(args.language, meta)
+    if args_chk(args, 'cui'):
+        names = get_cell_names(notebook.count())
+        gc = partial(get_contents, names)
+        sf = partial(show_cell, notebook,
+                     {name: i for i, name in enumerate(names)},
+                     lexer, ImageOutputs(notebook),
+                     get_limits(args.full_output),
+                     args)
+        interactive_cui(fpath.name, gc, sf)
+        return 0
+
+    if args_chk(args, 'output'):
+        outp = Path(args.output)
+        if outp.is_dir():
+            print_error(f'{args.output} is a directory. please specify a file.')
+            return 2
+        if not outp.parent.is_dir():
+            outp.parent.mkdir(parents=True)
+        with open(outp, 'w') as outf:
+            outf.write('#! /usr/bin/env python3\n')
+            writer = CellWriter(outf, '# ', lexer, None, None,
+                                get_num_cells(notebook), False,
+                                get_limits(args.full_output))
+            return write_cells(notebook, writer, meta, args)
+    else:
+        writer = CellWriter(sys.stdout, '', lexer, get_formatter(),
+                            ImageOutputs(notebook), get_num_cells(notebook),
+                            True, get_limits(args.full_output))
+        return write_cells(notebook, writer, meta, args)
@@ -1,12 +1,16 @@
+from __future__ import annotations
+
 import pickle
 import pprint
+import reprlib
 from pathlib import Path, PurePath
 from functools import partial
 from logging import getLogger
+from typing import Any
 
 from .. import (GLOBAL_CONF, Args, args_chk, get_config,
-                show_keys_dict, get_item_dict,
-                get_contents_dict, show_func_dict,
+                show_keys_dict, get_contents_dict, show_func_dict,
+                get_child_dict, is_dir_dict,
                 interactive_view, interactive_cui,
                 help_template, add_args_specification, add_args_encoding,
                 )
@@ -16,21 +20,61 @@ logger = getLogger(GLOBAL_CONF.logname)
 pargs = get_config('pp_kwargs')
 
 
-def add_info(data, cpath):
-    # remove root dir = file name.
-    path = '/'.join(PurePath(cpath).parts[1:])
-    tmp_data = get_item_dict(data, path)
-    if isinstance(tmp_data, dict):
-        return '', ''
-    else:
-        res = pprint.pformat(tmp_data, **pargs)
-        return '', f' :{res}'
+class VerboseInfo():
+    def __init__(self, data):
+        self.data = data
+        # resolved directories on the current traversal path.
+        self.dirs: dict[tuple[str, ...], Any] = {(): data}
+        self.repr = reprlib.Repr()
+        self.max_len = get_config('verbose_max_len', 'pickle')
+        if self.max_len > 0:
+            self.repr.maxstring = self.max_len
+            self.repr.maxother = self.max_len
+            self.repr.maxlong = self.max_len
+
+    def get_dir(self, parts: tuple[str, ...]) -> Any:
+        if parts not in self.dirs:
+            # show_tree goes depth-first, so only ancestors are kept.
+            self.dirs = {k: v for k, v in self.dirs.items()
+                         if k == parts[:len(k)]}
+            self.dirs[parts] = get_child_dict(self.get_dir(parts[:-1]),
+                                              parts[-1])
+        return self.dirs[parts]
+
+    def format(self, val: Any) -> str:
+        if self.max_len <= 0:
+            return pprint.pformat(val, **pargs)
+        res = ' '.join(self.repr.repr(val).split('\n'))
+        if len(res) > self.max_len:
+            res = res[:self.max_len-3]+'...'
+        return res
+
+    def __call__(self, cpath: str) -> tuple[str, str]:
+        # remove root dir = file name.
+        parts = PurePath(cpath).parts[1:]
+        if len(parts) == 0:
+            return '', ''
+        try:
+            tmp_data = get_child_dict(self.get_dir(parts[:-1]), parts[-1])
+        except KeyError:
+            return '', ''
+        if is_dir_dict(tmp_data):
+            self.dirs[parts] = tmp_data
+            return '', ''
+        else:
+            return '', f' :{self.format(tmp_data)}'
 
 
 def add_args(parser):
     add_args_encoding(parser)
+    kwargs_k = dict(help='Specify the key name to show.'
+                    ' Paths to nested items (e.g., "a/b/0") and'
+                    ' glob patterns (e.g., "runs/*/loss", "**/loss")'
+                    ' are also available.'
+                    ' If no key is provided, return the list of keys.')
     add_args_specification(parser, verbose=True, key=True,
-                           interactive=True, cui=True)
+                           interactive=True, cui=True,
+                           kwargs_k=kwargs_k)
 
 
 def show_help():
@@ -51,7 +95,7 @@ def main(fpath: Path, args: Args) -> int:
     fname = fpath.name
     gc = partial(get_contents_dict, data)
 
-    if isinstance(data, dict):
+    if isinstance(data, (dict, list, tuple)):
         if args_chk(args, 'key'):
             show_keys_dict(data, args.key)
         elif args_chk(args, 'interactive'):
@@ -60,7 +104,7 @@ def main(fpath: Path, args: Args) -> int:
             interactive_cui(fname, gc, partial(show_func_dict, data))
         else:
             if args_chk(args, 'verbose'):
-                addinfo = partial(add_info, data)
+                addinfo = VerboseInfo(data)
             else:
                 addinfo = None
             show_tree(fname, gc, logger=logger, add_info=addinfo)
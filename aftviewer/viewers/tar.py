@@ -10,8 +10,8 @@ from logging import getLogger
 from .. import (GLOBAL_CONF, Args, args_chk, print_key, print_error,
                 is_image, interactive_view, interactive_cui,
                 show_image_file, run_system_cmd, help_template,
-                add_args_imageviewer, add_args_output, add_args_specification
-                )
+                add_args_imageviewer, add_args_output, add_args_specification,
+                print_message)
 from .. import ReturnMessage as RM
 from pymeflib.tree2 import GC, BRANCH_STR1, show_tree
 logger = getLogger(GLOBAL_CONF.logname)
@@ -178,11 +178,9 @@ def main(fpath: Path, args: Args) -> int:
         for k in args.key:
             print_key(k)
             info = show_tar(tar_file, tmpdir, args, gc, k)
+            print_message(info)
             if not info.error:
-                print(info.message)
                 print()
-            else:
-                print_error(info.message)
     elif args_chk(args, 'verbose'):
         tar_file.list(verbose=True)
     else:
@@ -5,14 +5,15 @@ import zipfile
 import tempfile
 from functools import partial
 from getpass import getpass
+from collections.abc import Iterator
 from pathlib import Path, PurePosixPath
 from logging import getLogger
 
 from .. import (GLOBAL_CONF, Args, args_chk, is_image, print_key, print_error,
                 interactive_view, interactive_cui, show_image_file,
                 run_system_cmd, help_template,
-                add_args_imageviewer, add_args_output, add_args_specification
-                )
+                add_args_imageviewer, add_args_output, add_args_specification,
+                print_message)
 from .. import ReturnMessage as RM
 from pymeflib.tree2 import GC, BRANCH_STR1, show_tree
 logger = getLogger(GLOBAL_CONF.logname)
@@ -66,6 +67,18 @@ def get_contents(zip_file, path):
     return dirs, files
 
 
+def read_lines(f, first_line: str) -> Iterator[str]:
+    # lines are read from the archive only when they are shown.
+    with f:
+        yield first_line
+        for line in f:
+            try:
+                yield line.decode().replace("\n", '')
+            except UnicodeDecodeError as e:
+                yield f'Error!! {e}'
+                return
+
+
 def show_zip(zip_file: zipfile.ZipFile, pwd: None | bytes,
              tmpdir: None | tempfile.TemporaryDirectory,
              args: LocalArgs, get_contents: GC, cpath: str, **kwargs):
@@ -129,11 +142,15 @@ def show_zip(zip_file: zipfile.ZipFile, pwd: None | bytes,
 
         # text file?
         else:
-            for line in zip_file.open(key_name, 'r', pwd=pwd):
-                try:
-                    res.append(line.decode().replace("\n", ''))
-                except UnicodeDecodeError as e:
-                    return RM(f'Error!! {e}', True)
+            f = zip_file.open(key_name, 'r', pwd=pwd)
+            # binary files are found at the first line in most cases.
+            first = f.readline()
+            try:
+                first_line = first.decode().replace("\n", '')
+            except UnicodeDecodeError as e:
+                f.close()
+                return RM(f'Error!! {e}', True)
+            return RM(read_lines(f, first_line), False)
 
     return RM('\n'.join(res), False)
 
@@ -198,11 +215,9 @@ def main(fpath: Path, args: LocalArgs) -> int:
         for k in args.key:
             print_key(k)
             info = show_zip(zip_file, pwd, tmpdir, args, gc, k)
+            print_message(info)
             if not info.error:
-                print(info.message)
                 print()
-            else:
-                print_error(info.message)
     elif args_chk(args, 'verbose'):
         zip_file.printdir()
     else:
@@ -15,18 +15,24 @@ varis = {
 types = {
         '.core.types': ['Args', 'ReturnMessage',
                         ],
+        '.core.contents_cache': ['ContentsCache'],
         }
 
 funcs = {
         '.core': ['args_chk', 'get_config', 'get_col', 'get_args',
                   'cprint', 'print_key', 'print_error', 'print_warning',
+                  'print_message',
                   'interactive_view', 'run_system_cmd',
                   ],
         '.core.dict_viewer': ['show_keys_dict', 'get_item_dict',
                               'get_contents_dict', 'show_func_dict',
+                              'get_child_dict', 'is_dir_dict',
                               ],
+        '.core.json_loader': ['load_json', 'loads_json'],
+        '.core.contents_cache': ['cache_contents'],
         '.core.image_viewer': ['is_image',
                                'show_image_file', 'show_image_ndarray',
+                               'show_image_bytes',
                                ],
         '.core.helpmsg': ['help_template', 'add_args_imageviewer',
                           'add_args_encoding', 'add_args_output',